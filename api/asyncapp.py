@@ -0,0 +1,196 @@
+"""
+Asyncio variant of the authentication API, built on Quart.
+
+Receiving the upload and writing logs happen on the event loop, so a slow
+client only holds a coroutine, never an inference thread. Decoding and
+inference run in a bounded thread pool (TensorFlow, ONNX Runtime and OpenCV
+release the GIL, and the pool threads feed the same MicroBatcher as the Flask
+app). Once INFERENCE_WORKERS + INFERENCE_QUEUE requests are in the pool, new
+ones are answered 503 with a Retry-After header instead of queueing without
+limit.
+
+The model, templates, lockout and logging are shared with api/localapp.py.
+Lockout lookups and log writes can block (SQLite, a full log queue), so they
+also run in the pool rather than on the event loop.
+
+    hypercorn api.asyncapp:app --bind 0.0.0.0:8000
+"""
+import asyncio
+import contextvars
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, Request, Response, g, request, render_template, jsonify
+from werkzeug.utils import secure_filename
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.localapp import (BATCH_MAX_SIZE, FORM_OVERHEAD_BYTES, HTTP_REQUESTS, MAX_UPLOAD_BYTES, REQUEST_SECONDS,
+                          SERVER_TIMING, allowed_file, lockout_remaining, log_auth_attempt, model_slot, read_upload,
+                          record_attempt, upload_writer, verify_identity)
+from utils.embeddings import StaleTemplate
+from utils.metrics import registry as metrics_registry, stage, start_request
+from utils.upload_validation import UploadRejected, upload_stream_factory
+
+# Pool threads block on the MicroBatcher, so a full batch needs BATCH_MAX_SIZE of them
+INFERENCE_WORKERS = int(os.environ.get("VEINSECURE_INFERENCE_WORKERS", BATCH_MAX_SIZE))
+INFERENCE_QUEUE = int(os.environ.get("VEINSECURE_INFERENCE_QUEUE", 2 * BATCH_MAX_SIZE))
+RETRY_AFTER_SECONDS = 1
+
+
+class UploadRequest(Request):
+    """
+    Quart counterpart of localapp.UploadRequest: file parts are checked for
+    format and size while they are received.
+    """
+
+    def make_form_data_parser(self):
+        parser = super().make_form_data_parser()
+        parser.stream_factory = upload_stream_factory(MAX_UPLOAD_BYTES)
+        return parser
+
+
+app = Quart(__name__)
+app.request_class = UploadRequest
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES
+
+
+class ExecutorFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    Thread pool that refuses work instead of queueing it once `max_pending`
+    calls are running or waiting. Only used from the event loop thread, so the
+    counter needs no lock. bounded=False always queues the call; it is meant
+    for short bookkeeping (lockout and log writes) that must not be dropped.
+    """
+
+    def __init__(self, max_workers, max_queue):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="inference")
+        self.max_pending = max_workers + max_queue
+        self.pending = 0
+
+    async def run(self, fn, *args, bounded=True):
+        if bounded and self.pending >= self.max_pending:
+            raise ExecutorFull()
+        self.pending += 1
+        try:
+            # Run in a copy of this context so stage timings reach the request's timer
+            context = contextvars.copy_context()
+            return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, fn, *args)
+        finally:
+            self.pending -= 1
+
+
+inference_pool = BoundedExecutor(INFERENCE_WORKERS, INFERENCE_QUEUE)
+
+
+@app.before_request
+async def start_timer():
+    g.timer = start_request()
+
+
+@app.errorhandler(UploadRejected)
+async def upload_rejected(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+@app.after_request
+async def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    REQUEST_SECONDS.observe(g.timer.elapsed(), endpoint=endpoint)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = g.timer.server_timing()
+    return response
+
+
+@app.route('/')
+async def index():
+    return await render_template("index.html")
+
+
+@app.route('/metrics')
+async def metrics():
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/authenticate', methods=["POST"])
+async def authenticate():
+    response = {
+        "prediction": None,
+        "confidence": None,
+        "filename": None,
+        "error": None,
+        "access_granted": False,
+        "model_version": None
+    }
+
+    if model_slot.current().model is None:
+        response["error"] = "Model not loaded."
+        return jsonify(response), 500
+
+    with stage("receive"):
+        form = await request.form
+    claimed_identity = form.get("claimed_identity")
+    if not claimed_identity:
+        response["error"] = "No identity selected."
+        return jsonify(response), 400
+    response["claimed_identity"] = claimed_identity
+
+    wait_time = await inference_pool.run(lockout_remaining, claimed_identity, bounded=False)
+    if wait_time:
+        response["error"] = f"Too many failed attempts. Try again in {wait_time} seconds."
+        await inference_pool.run(log_auth_attempt, claimed_identity, "N/A", "LOCKED",
+                                 f"Anomaly detected, retry allowed in {wait_time} sec", bounded=False)
+        return jsonify(response), 429
+
+    files = await request.files
+    file = files.get("file")
+    if file is None or file.filename == "":
+        response["error"] = "No file uploaded."
+        return jsonify(response), 400
+    if not allowed_file(file.filename):
+        response["error"] = "Unsupported file type."
+        return jsonify(response), 415
+
+    try:
+        with stage("validate"):
+            image_bytes = read_upload(file)
+    except UploadRejected as e:
+        response["error"] = str(e)
+        return jsonify(response), e.status
+
+    filename = secure_filename(file.filename)
+    if upload_writer is not None:
+        upload_writer.save(filename, image_bytes)
+    response["filename"] = filename
+
+    try:
+        access_granted, class_name, confidence, version = await inference_pool.run(
+            verify_identity, claimed_identity, image_bytes)
+    except ExecutorFull:
+        response["error"] = "Server busy, try again shortly."
+        return jsonify(response), 503, {"Retry-After": str(RETRY_AFTER_SECONDS)}
+    except StaleTemplate as e:
+        response["error"] = str(e)
+        await inference_pool.run(log_auth_attempt, claimed_identity, "ERROR", "FAILED", bounded=False)
+        return jsonify(response), 503
+    except Exception as e:
+        response["error"] = f"Prediction failed: {str(e)}"
+        await inference_pool.run(log_auth_attempt, claimed_identity, "ERROR", "FAILED", bounded=False)
+        return jsonify(response), 500
+
+    response["model_version"] = version
+    response["prediction"] = class_name
+    response["confidence"] = round(confidence * 100, 2)
+    response["access_granted"] = access_granted
+    await inference_pool.run(record_attempt, claimed_identity, class_name, access_granted, bounded=False)
+    return jsonify(response), 200
+
+
+if __name__ == "__main__":
+    app.run(debug=True)
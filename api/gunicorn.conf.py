@@ -0,0 +1,69 @@
+"""
+gunicorn settings for api/wsgi.py.
+
+    gunicorn -c api/gunicorn.conf.py api.wsgi:app
+
+- `workers` processes (VEINSECURE_WORKERS, default: one per 2 cores), each
+  with a few threads so the MicroBatcher can group concurrent requests.
+- The app is imported in the master before forking (preload_app), so
+  TensorFlow, Flask and the rest of the code are shared copy-on-write. TFLite
+  and ONNX models are loaded there as well and their weights are shared by all
+  workers. A Keras model cannot be: TensorFlow's thread pools do not survive
+  fork() and a forked worker would hang on its first prediction, so the Keras
+  model is loaded in each worker right after fork.
+- Each worker gets cores // workers intra-op threads and one inter-op thread,
+  so workers do not oversubscribe the CPU.
+- With more than one worker, lockouts are kept in a shared SQLite store
+  (api/logs/lockouts.db) unless VEINSECURE_LOCKOUT_STORE says otherwise.
+
+Hot reload: /admin/reload only reaches the worker that handles the request.
+Set VEINSECURE_MODEL_WATCH_SECONDS so every worker picks up a new model file.
+"""
+import multiprocessing
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.backends import backend_for
+from utils.model_registry import DEFAULT_MODEL_PATH
+
+bind = os.environ.get("VEINSECURE_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("VEINSECURE_WORKERS") or max(1, multiprocessing.cpu_count() // 2))
+worker_class = "gthread"
+threads = int(os.environ.get("VEINSECURE_WORKER_THREADS", 8))
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+# Restart workers now and then to cap slow memory growth
+max_requests = int(os.environ.get("VEINSECURE_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+
+# ----- CPU threads per worker -----
+# Read by utils/backends.py (TensorFlow, TFLite, ONNX Runtime); OMP_NUM_THREADS
+# covers oneDNN and OpenCV. Set before the app (and TensorFlow) is imported.
+intra_op = max(1, multiprocessing.cpu_count() // workers)
+os.environ.setdefault("VEINSECURE_INTRA_OP_THREADS", str(intra_op))
+os.environ.setdefault("VEINSECURE_INTER_OP_THREADS", "1")
+os.environ.setdefault("OMP_NUM_THREADS", os.environ["VEINSECURE_INTRA_OP_THREADS"])
+os.environ.setdefault("TF_NUM_INTRAOP_THREADS", os.environ["VEINSECURE_INTRA_OP_THREADS"])
+os.environ.setdefault("TF_NUM_INTEROP_THREADS", os.environ["VEINSECURE_INTER_OP_THREADS"])
+
+# ----- Shared state -----
+# Lockouts must be visible to every worker
+if workers > 1:
+    os.environ.setdefault("VEINSECURE_LOCKOUT_STORE", "sqlite:///" + os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "logs", "lockouts.db"))
+
+# ----- Model loading -----
+_backend = backend_for(os.environ.get("VEINSECURE_MODEL_PATH") or DEFAULT_MODEL_PATH,
+                       os.environ.get("VEINSECURE_BACKEND") or None)
+os.environ.setdefault("VEINSECURE_MODEL_LOAD", "worker" if _backend == "keras" else "preload")
+
+
+def post_fork(server, worker):
+    import cv2
+    from api.localapp import init_model
+
+    cv2.setNumThreads(int(os.environ["VEINSECURE_INTRA_OP_THREADS"]))
+    init_model()
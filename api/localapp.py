@@ -1,62 +1,456 @@
-from flask import Flask, request, render_template, jsonify
-from tensorflow.keras.models import load_model
-from datetime import datetime, timedelta
-from collections import defaultdict
+from flask import Flask, Request, Response, g, request, render_template, jsonify
+from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import hmac
 import os
 import sys
+import time
 
 # ----- Paths -----
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
 LOGS_FOLDER = os.path.join(BASE_DIR, "logs")
-MODEL_PATH = os.path.join(BASE_DIR, "..", "results", "models", "final_model.h5")
+MODEL_PATH = os.environ.get("VEINSECURE_MODEL_PATH", os.path.join(BASE_DIR, "..", "results", "models", "final_model.h5"))
+TEMPLATES_PATH = os.path.join(BASE_DIR, "..", "results", "models", "templates.npz")
 HELPER_PATH = os.path.abspath(os.path.join(BASE_DIR, '..'))
 sys.path.append(HELPER_PATH)
 
-from utils.helperslocal import predict_image
+from utils.helperslocal import (decode_image_bytes, decode_image_batch, predict_batch, decode_prediction,
+                                fuse_predictions)
+from utils.batching import MicroBatcher
+from utils.model_registry import ModelSlot, registry as model_registry, warm_up
+from utils.audit import AuthLogWriter, UploadAuditWriter
+from utils.embeddings import AlreadyEnrolled, SharedTemplateStore, StaleTemplate, build_embedding_model
+from utils.vector_index import build_index
+from utils.ratelimit import make_lockout_store
+from utils.result_cache import ResultCache, content_hash
+from utils.upload_validation import UploadRejected, upload_stream_factory, validate_upload
+from utils.metrics import registry as metrics_registry, stage, start_request
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'bmp', 'gif'}
+# Uploads are decoded in memory; set VEINSECURE_SAVE_UPLOADS=1 to keep a copy
+# of each one in UPLOAD_FOLDER (written in the background) for auditing.
+SAVE_UPLOADS = os.environ.get("VEINSECURE_SAVE_UPLOADS", "0") == "1"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(LOGS_FOLDER, exist_ok=True)
 
 # ----- Flask App -----
+# Per image; uploads are also checked for format and dimensions before they are read
+MAX_UPLOAD_BYTES = int(float(os.environ.get("VEINSECURE_MAX_UPLOAD_MB", 8)) * 1024 * 1024)
+# Room for the multipart boundaries and text fields around the image(s)
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+class UploadRequest(Request):
+    """
+    Request whose multipart file parts are checked while they are received:
+    a part with the wrong magic bytes, or larger than MAX_UPLOAD_BYTES, fails
+    with UploadRejected before the rest of the body is spooled.
+    """
+    def make_form_data_parser(self):
+        parser = super().make_form_data_parser()
+        parser.stream_factory = upload_stream_factory(MAX_UPLOAD_BYTES)
+        return parser
+
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB
+# One image per request; the multi-image routes raise it to BATCH_MAX_FRAMES images
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES
 
 # ----- Load Model -----
-try:
-    model = load_model(MODEL_PATH)
-    class_names = [f"{i:03d}" for i in range(1, 42)]
-except Exception as e:
-    print(f"Model load failed: {e}")
-    model = None
-    class_names = [f"{i:03d}" for i in range(1, 42)]
+# Concurrent /authenticate requests are grouped into one forward pass of up to
+# BATCH_MAX_SIZE images; the model is warmed up at that size too.
+BATCH_MAX_SIZE = int(os.environ.get("VEINSECURE_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("VEINSECURE_BATCH_MAX_WAIT_MS", 5))
+# VEINSECURE_BACKEND picks the inference engine ("keras", "tflite" or "onnx"); by default
+# it follows the MODEL_PATH extension. See utils/backends.py.
+INFERENCE_BACKEND = os.environ.get("VEINSECURE_BACKEND") or None
+# Poll MODEL_PATH every N seconds and hot-reload it when it changes (0 = off);
+# POST /admin/reload triggers a reload on demand, of MODEL_PATH or of another
+# model file inside MODELS_DIR (default: the folder of MODEL_PATH).
+# VEINSECURE_ADMIN_TOKEN: callers of /enroll and /admin/* must send it in an
+# X-Admin-Token header. Without it set, those routes are disabled.
+MODEL_WATCH_SECONDS = float(os.environ.get("VEINSECURE_MODEL_WATCH_SECONDS", 0))
+ADMIN_TOKEN = os.environ.get("VEINSECURE_ADMIN_TOKEN")
+MODELS_DIR = os.path.realpath(os.environ.get("VEINSECURE_MODELS_DIR") or os.path.dirname(MODEL_PATH))
+MODEL_EXTENSIONS = (".h5", ".keras", ".tflite", ".onnx")
+# When to load the model: "import" (default, single process), "preload" (load
+# now but start the watcher per worker) or "worker" (load after fork).
+# api/gunicorn.conf.py picks one and calls init_model() in every worker.
+MODEL_LOAD = os.environ.get("VEINSECURE_MODEL_LOAD", "import")
+class_names = [f"{i:03d}" for i in range(1, 42)]
+
+# ----- Verification Mode -----
+# "classifier": grant access when the softmax top-1 class equals the claimed ID.
+# "embedding": compare the penultimate-layer embedding with the claimed user's
+# enrollment template (see utils/embeddings.py); users enroll via /enroll.
+AUTH_MODE = os.environ.get("VEINSECURE_AUTH_MODE", "classifier")
+
+def prepare_embedding_model(model):
+    # Embeddings need the Keras graph; other backends only serve the classifier.
+    if not hasattr(model, "layers"):
+        return None
+    embedding_model = build_embedding_model(model)
+    if AUTH_MODE == "embedding":
+        warm_up(embedding_model, (1, BATCH_MAX_SIZE))
+    return embedding_model
+
+# Requests read model_slot.current() once and use that version throughout, so a
+# reload never mixes two models within one request. Enrollment templates are
+# tied to the embedding space they were computed in and record the model
+# version: after a retrained model is swapped in, users enrolled with the old
+# one get 503 from /authenticate (and drop out of /identify) until re-enrolled.
+model_slot = ModelSlot(MODEL_PATH, INFERENCE_BACKEND, prepare=prepare_embedding_model,
+                       warmup_batch_sizes=(1, BATCH_MAX_SIZE))
+
+def init_model(watch=True):
+    """
+    Load the first model version (unless already loaded) and start the file watcher.
+    """
+    if model_slot.current().model is None:
+        try:
+            # Shared with utils.helperslocal through the registry, so the process holds one copy
+            model_slot.load_initial()
+        except Exception as e:
+            print(f"Model load failed: {e}")
+    if watch and MODEL_WATCH_SECONDS > 0:
+        model_slot.watch(MODEL_WATCH_SECONDS)
+
+if MODEL_LOAD in ("import", "preload"):
+    init_model(watch=MODEL_LOAD == "import")
+
+# Templates live in TEMPLATES_PATH, shared by all workers: reads call
+# templates.refresh() to pick up enrollments made by another worker, and
+# enroll() merges into the file under a lock (see SharedTemplateStore).
+VERIFY_THRESHOLD = os.environ.get("VEINSECURE_VERIFY_THRESHOLD")
+templates = SharedTemplateStore(TEMPLATES_PATH, threshold=float(VERIFY_THRESHOLD) if VERIFY_THRESHOLD else None)
+
+# ----- Identification (1:N) -----
+# /identify reveals enrolled IDs and their scores, so callers must send
+# VEINSECURE_IDENTIFY_TOKEN as an X-Identify-Token header (or the admin token);
+# with neither token set the route is disabled. Each client address gets at
+# most IDENTIFY_RATE_LIMIT lookups without an IDENTIFY_RATE_WINDOW-second pause.
+IDENTIFY_TOP_K = 5
+IDENTIFY_MAX_TOP_K = 10
+IDENTIFY_TOKEN = os.environ.get("VEINSECURE_IDENTIFY_TOKEN")
+IDENTIFY_RATE_LIMIT = int(os.environ.get("VEINSECURE_IDENTIFY_RATE_LIMIT", 30))
+IDENTIFY_RATE_WINDOW = 60  # seconds
+IDENTIFY_BUDGET_MS = float(os.environ.get("VEINSECURE_IDENTIFY_BUDGET_MS", 50))
+_index_cache = {"current": (None, None, None)}  # (templates matrix, model version, index built from it)
+
+def get_identification_index(version):
+    """
+    Search index over the enrollment templates made with model `version`,
+    rebuilt only after /enroll has changed them or the model has changed.
+    """
+    templates.refresh()
+    _, matrix = templates.snapshot()
+    cached_matrix, cached_version, index = _index_cache["current"]
+    if cached_matrix is not matrix or cached_version != version:
+        index = build_index(*templates.snapshot(version))
+        _index_cache["current"] = (matrix, version, index)
+    return index
+
+# ----- Inference Batching -----
+# Each batch runs on whichever model version is current when it is formed; every
+# row comes back as (output, model_version).
+def predict_versioned(images, embedding=False):
+    current = model_slot.current()
+    net = current.embedding_model if embedding else current.model
+    return [(row, current.version) for row in predict_batch(images, net)]
+
+batcher = MicroBatcher(predict_versioned, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+embedding_batcher = MicroBatcher(lambda images: predict_versioned(images, embedding=True),
+                                 max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+upload_writer = UploadAuditWriter(UPLOAD_FOLDER) if SAVE_UPLOADS else None
+
+# Model outputs for recently seen uploads, keyed by a hash of the raw bytes and
+# the model version: byte-identical retries skip decoding and inference.
+# VEINSECURE_RESULT_CACHE_SIZE=0 turns the cache off.
+result_cache = ResultCache(max_entries=int(os.environ.get("VEINSECURE_RESULT_CACHE_SIZE", 1024)),
+                           ttl_seconds=float(os.environ.get("VEINSECURE_RESULT_CACHE_TTL", 300)))
+
+def infer_bytes(image_bytes, embedding=False):
+    """
+    Model output (class probabilities, or the embedding) for one encoded image,
+    from the result cache when possible. Returns (output, model_version).
+    """
+    digest = content_hash(image_bytes)
+    head = "embedding" if embedding else "classifier"
+    version = model_slot.current().version
+    with stage("cache"):
+        output = result_cache.get((digest, version, head))
+    if output is not None:
+        return output, version
+    with stage("decode"):
+        image = decode_image_bytes(image_bytes)
+    with stage("inference"):
+        output, version = (embedding_batcher if embedding else batcher).predict(image)
+    # Copy the row so the cache does not keep the whole batch array alive
+    result_cache.put((digest, version, head), np.array(output))
+    return output, version
+
+# /authenticate/batch: frames are decoded in parallel (OpenCV releases the GIL),
+# resized and scaled as one batch by preprocess_batch and run through the model together.
+BATCH_MAX_FRAMES = int(os.environ.get("VEINSECURE_BATCH_MAX_FRAMES", 16))
+decode_pool = ThreadPoolExecutor(int(os.environ.get("VEINSECURE_DECODE_WORKERS", min(8, os.cpu_count() or 1))),
+                                 thread_name_prefix="decode")
 
 # ----- Logging -----
+# Attempts are written in batches by a background thread (utils/audit.py) and
+# flushed at exit. VEINSECURE_LOG_JSON=1 writes JSON lines to login_attempts.jsonl
+# instead; the file rotates at VEINSECURE_LOG_MAX_MB or daily.
+LOG_JSON = os.environ.get("VEINSECURE_LOG_JSON", "0") == "1"
+auth_log = AuthLogWriter(os.path.join(LOGS_FOLDER, "login_attempts.jsonl" if LOG_JSON else "login_attempts.log"),
+                         json_lines=LOG_JSON,
+                         max_bytes=int(float(os.environ.get("VEINSECURE_LOG_MAX_MB", 10)) * 2**20))
+
 def log_auth_attempt(claimed_id, predicted_id, status, note=None):
-    log_file = os.path.join(LOGS_FOLDER, "login_attempts.log")
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] Claimed: {claimed_id}, Predicted: {predicted_id}, Access: {status}"
-    if note:
-        entry += f" | Note: {note}"
-    with open(log_file, "a") as f:
-        f.write(entry + "\n")
+    AUTH_OUTCOMES.inc(outcome={"FAILED": "error"}.get(status, status.lower()))
+    with stage("log"):
+        auth_log.log(claimed_id, predicted_id, status, note)
+
+# ----- Metrics -----
+# Prometheus text on /metrics (per process). VEINSECURE_SERVER_TIMING=1 also adds a
+# Server-Timing header with the stage durations of each response.
+SERVER_TIMING = os.environ.get("VEINSECURE_SERVER_TIMING", "0") == "1"
+AUTH_OUTCOMES = metrics_registry.counter("veinsecure_auth_attempts_total",
+                                         "Authentication attempts by outcome (granted, denied, locked, error).",
+                                         ["outcome"])
+HTTP_REQUESTS = metrics_registry.counter("veinsecure_http_requests_total", "HTTP requests by endpoint and status.",
+                                         ["endpoint", "status"])
+REQUEST_SECONDS = metrics_registry.histogram("veinsecure_request_seconds", "End-to-end request time.", ["endpoint"])
+metrics_registry.gauge("veinsecure_result_cache_hits", "Result cache hits since start.", lambda: result_cache.hits)
+metrics_registry.gauge("veinsecure_result_cache_misses", "Result cache misses since start.", lambda: result_cache.misses)
+metrics_registry.gauge("veinsecure_result_cache_entries", "Entries in the result cache.",
+                       lambda: result_cache.stats()["entries"])
+
+@app.before_request
+def start_timer():
+    g.timer = start_request()
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(e):
+    """
+    An upload refused while the form was being parsed (see UploadRequest).
+    """
+    return jsonify({"error": str(e)}), e.status
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    REQUEST_SECONDS.observe(g.timer.elapsed(), endpoint=endpoint)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = g.timer.server_timing()
+    return response
 
 # ----- Rate Limiting (Lockout) -----
-failed_attempts = defaultdict(lambda: {"count": 0, "last_failed_time": None})
 LOCKOUT_THRESHOLD = 5
-LOCKOUT_TIME = timedelta(seconds=60)
+LOCKOUT_TIME = 60  # seconds
+# "memory" keeps lockouts per process; with several workers use a shared store,
+# e.g. VEINSECURE_LOCKOUT_STORE=sqlite:///api/logs/lockouts.db (see utils/ratelimit.py).
+# Failure counts are forgotten after LOCKOUT_TTL seconds without a new failure.
+LOCKOUT_STORE = os.environ.get("VEINSECURE_LOCKOUT_STORE", "memory")
+LOCKOUT_TTL = int(os.environ.get("VEINSECURE_LOCKOUT_TTL", 900))
+failed_attempts = make_lockout_store(LOCKOUT_STORE, threshold=LOCKOUT_THRESHOLD, lockout_seconds=LOCKOUT_TIME,
+                                     ttl_seconds=LOCKOUT_TTL,
+                                     max_entries=int(os.environ.get("VEINSECURE_LOCKOUT_MAX_ENTRIES", 100000)))
+
+# Lookups per client address on /identify, counted like failures (see IDENTIFY_RATE_LIMIT)
+identify_lookups = make_lockout_store(LOCKOUT_STORE, threshold=IDENTIFY_RATE_LIMIT,
+                                      lockout_seconds=IDENTIFY_RATE_WINDOW, ttl_seconds=IDENTIFY_RATE_WINDOW,
+                                      max_entries=int(os.environ.get("VEINSECURE_LOCKOUT_MAX_ENTRIES", 100000)),
+                                      table="identify_lookups")
+
+def lockout_remaining(claimed_identity):
+    """
+    Seconds until `claimed_identity` may try again, or 0 if it is not locked out.
+    """
+    return failed_attempts.locked_for(claimed_identity)
+
+def record_attempt(claimed_identity, predicted_id, access_granted):
+    """
+    Reset or bump the failure count for `claimed_identity` and log the attempt.
+    """
+    if access_granted:
+        failed_attempts.reset(claimed_identity)
+        log_auth_attempt(claimed_identity, predicted_id, "GRANTED")
+    else:
+        failed_attempts.record_failure(claimed_identity)
+        log_auth_attempt(claimed_identity, predicted_id, "DENIED")
 
 # ----- Helpers -----
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def allow_multiple_uploads():
+    """
+    Raise this request's body limit to BATCH_MAX_FRAMES images. Call before
+    touching request.form or request.files.
+    """
+    request.max_content_length = BATCH_MAX_FRAMES * MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES
+
+def read_upload(file):
+    """
+    Bytes of one uploaded image, read only after its magic bytes and header
+    dimensions have been checked. Raises UploadRejected.
+    """
+    return validate_upload(file.stream, max_bytes=MAX_UPLOAD_BYTES)[0]
+
+def admin_denied():
+    """
+    Error message unless the request carries the admin token, else None.
+    Fails closed: with no VEINSECURE_ADMIN_TOKEN configured nothing is allowed.
+    """
+    if not ADMIN_TOKEN:
+        return "Disabled: VEINSECURE_ADMIN_TOKEN is not set."
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode()):
+        return "Forbidden."
+    return None
+
+def identify_denied():
+    """
+    Error message unless the request carries the identify token or the admin
+    token, else None. Fails closed when neither token is configured.
+    """
+    if not IDENTIFY_TOKEN and not ADMIN_TOKEN:
+        return "Disabled: VEINSECURE_IDENTIFY_TOKEN is not set."
+    if IDENTIFY_TOKEN and hmac.compare_digest(request.headers.get("X-Identify-Token", "").encode(),
+                                              IDENTIFY_TOKEN.encode()):
+        return None
+    if admin_denied() is None:
+        return None
+    return "Forbidden."
+
+def resolve_model_path(path):
+    """
+    Absolute path of a model file named by an admin request (relative paths are
+    taken from MODELS_DIR), or None unless it is an existing model file inside
+    MODELS_DIR.
+    """
+    resolved = os.path.realpath(os.path.join(MODELS_DIR, path))
+    if os.path.commonpath([resolved, MODELS_DIR]) != MODELS_DIR:
+        return None
+    if not resolved.lower().endswith(MODEL_EXTENSIONS) or not os.path.isfile(resolved):
+        return None
+    return resolved
+
+def verify_identity(claimed_identity, image_bytes):
+    """
+    Check one encoded image against a claimed identity using AUTH_MODE.
+    Returns (access_granted, predicted_id, confidence in [0, 1], model_version).
+    """
+    if AUTH_MODE == "embedding":
+        templates.refresh()
+        if claimed_identity not in templates:
+            return False, None, 0.0, model_slot.current().version
+        embedding, version = infer_bytes(image_bytes, embedding=True)
+        accepted, score = templates.verify(claimed_identity, embedding, version=version)
+        return accepted, claimed_identity if accepted else None, max(score, 0.0), version
+
+    pred_probs, version = infer_bytes(image_bytes)
+    class_id, class_name, confidence = decode_prediction(pred_probs, class_names)
+    return claimed_identity == class_name, class_name, confidence, version
+
+def verify_frames(claimed_identities, images):
+    """
+    Check several frames in one forward pass. claimed_identities[i] is the
+    identity claimed for images[i]; frames with the same claim are fused (mean
+    class probabilities, or mean embedding in embedding mode) into one decision.
+    Returns (per-frame results, per-identity decisions, model_version).
+    """
+    current = model_slot.current()
+    frames, decisions = [], []
+    claims = list(dict.fromkeys(claimed_identities))
+    if AUTH_MODE == "embedding":
+        if current.embedding_model is None:
+            raise RuntimeError("Embeddings need the Keras backend.")
+        templates.refresh()
+        embeddings = predict_batch(np.asarray(images), current.embedding_model)
+        for claimed_identity, embedding in zip(claimed_identities, embeddings):
+            score = 0.0
+            if claimed_identity in templates:
+                score = templates.similarity(claimed_identity, embedding, version=current.version)
+            frames.append({"prediction": None, "confidence": max(score, 0.0)})
+        for claimed_identity in claims:
+            rows = [i for i, c in enumerate(claimed_identities) if c == claimed_identity]
+            accepted, score = False, 0.0
+            if claimed_identity in templates:
+                accepted, score = templates.verify(claimed_identity, np.mean(embeddings[rows], axis=0),
+                                                   version=current.version)
+            decisions.append({"claimed_identity": claimed_identity, "frames": len(rows),
+                              "prediction": claimed_identity if accepted else None,
+                              "confidence": max(score, 0.0), "access_granted": accepted})
+        return frames, decisions, current.version
+
+    pred_probs = predict_batch(np.asarray(images), current.model)
+    for row in pred_probs:
+        _, class_name, confidence = decode_prediction(row, class_names)
+        frames.append({"prediction": class_name, "confidence": confidence})
+    for claimed_identity in claims:
+        rows = [i for i, c in enumerate(claimed_identities) if c == claimed_identity]
+        _, class_name, confidence = fuse_predictions(pred_probs[rows], class_names)
+        decisions.append({"claimed_identity": claimed_identity, "frames": len(rows), "prediction": class_name,
+                          "confidence": confidence, "access_granted": class_name == claimed_identity})
+    return frames, decisions, current.version
+
+def embeddings_unavailable():
+    """
+    Error message if the current model cannot produce embeddings, else None.
+    """
+    current = model_slot.current()
+    if current.embedding_model is not None:
+        return None
+    return "Model not loaded." if current.model is None else "Embeddings need the Keras backend."
+
 # ----- Routes -----
 @app.route('/')
 def index():
     return render_template("index.html")
 
+@app.route('/admin/models')
+def model_stats():
+    error = admin_denied()
+    if error:
+        return jsonify({"error": error}), 403
+    current = model_slot.current()
+    return jsonify({
+        "serving": {"version": current.version, "path": current.path, "loaded_at": current.loaded_at},
+        "reload": model_slot.status,
+        "loaded": model_registry.stats(),
+    }), 200
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/admin/cache')
+def cache_stats():
+    error = admin_denied()
+    if error:
+        return jsonify({"error": error}), 403
+    return jsonify(result_cache.stats()), 200
+
+@app.route('/admin/reload', methods=["POST"])
+def reload_model():
+    """
+    Load a model file in the background and swap it in once it is warmed up.
+    Optional form field "path" switches to a different model file in MODELS_DIR.
+    """
+    error = admin_denied()
+    if error:
+        return jsonify({"error": error}), 403
+    path = request.form.get("path") or None
+    if path is not None:
+        path = resolve_model_path(path)
+        if path is None:
+            return jsonify({"error": "No such model file in the models directory."}), 400
+    if not model_slot.reload(path):
+        return jsonify({"error": "A reload is already in progress.", "reload": model_slot.status}), 409
+    return jsonify({"model_version": model_slot.current().version, "reload": model_slot.status}), 202
+
 @app.route('/authenticate', methods=["POST"])
 def authenticate():
     response = {
@@ -64,28 +458,28 @@ def authenticate():
         "confidence": None,
         "filename": None,
         "error": None,
-        "access_granted": False
+        "access_granted": False,
+        "model_version": None
     }
 
-    if model is None:
+    if model_slot.current().model is None:
         response["error"] = "Model not loaded."
         return jsonify(response), 500
 
-    claimed_identity = request.form.get("claimed_identity")
+    with stage("receive"):
+        # The first access to request.form reads and parses the whole upload
+        claimed_identity = request.form.get("claimed_identity")
     if not claimed_identity:
         response["error"] = "No identity selected."
         return jsonify(response), 400
     response["claimed_identity"] = claimed_identity
 
     # 🔒 Rate-limiting check
-    user_state = failed_attempts[claimed_identity]
-    if user_state["count"] >= LOCKOUT_THRESHOLD:
-        time_diff = datetime.now() - user_state["last_failed_time"]
-        if time_diff < LOCKOUT_TIME:
-            wait_time = int((LOCKOUT_TIME - time_diff).total_seconds())
-            response["error"] = f"Too many failed attempts. Try again in {wait_time} seconds."
-            log_auth_attempt(claimed_identity, "N/A", "LOCKED", f"Anomaly detected, retry allowed in {wait_time} sec")
-            return jsonify(response), 429  # Too Many Requests
+    wait_time = lockout_remaining(claimed_identity)
+    if wait_time:
+        response["error"] = f"Too many failed attempts. Try again in {wait_time} seconds."
+        log_auth_attempt(claimed_identity, "N/A", "LOCKED", f"Anomaly detected, retry allowed in {wait_time} sec")
+        return jsonify(response), 429  # Too Many Requests
 
     if "file" not in request.files:
         response["error"] = "No file uploaded."
@@ -100,26 +494,31 @@ def authenticate():
         response["error"] = "Unsupported file type."
         return jsonify(response), 415
 
-    filename = file.filename
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(file_path)
+    try:
+        with stage("validate"):
+            image_bytes = read_upload(file)
+    except UploadRejected as e:
+        response["error"] = str(e)
+        return jsonify(response), e.status
+
+    filename = secure_filename(file.filename)
+    if upload_writer is not None:
+        with stage("save"):
+            upload_writer.save(filename, image_bytes)
     response["filename"] = filename
 
     try:
-        class_id, class_name, confidence = predict_image(file_path, model, class_names)
+        access_granted, class_name, confidence, version = verify_identity(claimed_identity, image_bytes)
+        response["model_version"] = version
         response["prediction"] = class_name
         response["confidence"] = round(confidence * 100, 2)
+        response["access_granted"] = access_granted
+        record_attempt(claimed_identity, class_name, access_granted)
 
-        if claimed_identity == class_name:
-            response["access_granted"] = True
-            failed_attempts[claimed_identity] = {"count": 0, "last_failed_time": None}
-            log_auth_attempt(claimed_identity, class_name, "GRANTED")
-        else:
-            response["access_granted"] = False
-            failed_attempts[claimed_identity]["count"] += 1
-            failed_attempts[claimed_identity]["last_failed_time"] = datetime.now()
-            log_auth_attempt(claimed_identity, class_name, "DENIED")
-
+    except StaleTemplate as e:
+        response["error"] = str(e)
+        log_auth_attempt(claimed_identity, "ERROR", "FAILED")
+        return jsonify(response), 503
     except Exception as e:
         response["error"] = f"Prediction failed: {str(e)}"
         log_auth_attempt(claimed_identity, "ERROR", "FAILED")
@@ -127,6 +526,208 @@ def authenticate():
 
     return jsonify(response), 200
 
+@app.route('/authenticate/batch', methods=["POST"])
+def authenticate_batch():
+    """
+    Authenticate several frames in one request. Send the images as repeated
+    "file" fields and either one "claimed_identity" for all of them or one per
+    image. Frames claiming the same identity are fused into one decision,
+    which counts as one attempt (one lockout failure if denied) per identity.
+    """
+    response = {"results": [], "decisions": [], "access_granted": False, "model_version": None, "error": None}
+
+    if model_slot.current().model is None:
+        response["error"] = "Model not loaded."
+        return jsonify(response), 500
+
+    allow_multiple_uploads()
+    with stage("receive"):
+        files = [f for f in request.files.getlist("file") if f.filename]
+    if not files:
+        response["error"] = "No file uploaded."
+        return jsonify(response), 400
+    if len(files) > BATCH_MAX_FRAMES:
+        response["error"] = f"At most {BATCH_MAX_FRAMES} images per request."
+        return jsonify(response), 400
+    if not all(allowed_file(f.filename) for f in files):
+        response["error"] = "Unsupported file type."
+        return jsonify(response), 415
+
+    claimed_identities = request.form.getlist("claimed_identity")
+    if len(claimed_identities) == 1:
+        claimed_identities = claimed_identities * len(files)
+    if not claimed_identities or not all(claimed_identities) or len(claimed_identities) != len(files):
+        response["error"] = "Give one claimed identity, or one per image."
+        return jsonify(response), 400
+
+    for claimed_identity in dict.fromkeys(claimed_identities):
+        wait_time = lockout_remaining(claimed_identity)
+        if wait_time:
+            response["error"] = f"Too many failed attempts for {claimed_identity}. Try again in {wait_time} seconds."
+            log_auth_attempt(claimed_identity, "N/A", "LOCKED", f"Anomaly detected, retry allowed in {wait_time} sec")
+            return jsonify(response), 429
+
+    try:
+        with stage("validate"):
+            payloads = [read_upload(f) for f in files]
+    except UploadRejected as e:
+        response["error"] = str(e)
+        return jsonify(response), e.status
+
+    filenames = [secure_filename(f.filename) for f in files]
+    if upload_writer is not None:
+        with stage("save"):
+            for filename, image_bytes in zip(filenames, payloads):
+                upload_writer.save(filename, image_bytes)
+
+    try:
+        with stage("decode"):
+            images = decode_image_batch(payloads, map_fn=decode_pool.map)
+        with stage("inference"):
+            frames, decisions, version = verify_frames(claimed_identities, images)
+    except StaleTemplate as e:
+        response["error"] = str(e)
+        for claimed_identity in dict.fromkeys(claimed_identities):
+            log_auth_attempt(claimed_identity, "ERROR", "FAILED")
+        return jsonify(response), 503
+    except Exception as e:
+        response["error"] = f"Prediction failed: {str(e)}"
+        for claimed_identity in dict.fromkeys(claimed_identities):
+            log_auth_attempt(claimed_identity, "ERROR", "FAILED")
+        return jsonify(response), 500
+
+    for filename, claimed_identity, frame in zip(filenames, claimed_identities, frames):
+        response["results"].append({"filename": filename, "claimed_identity": claimed_identity,
+                                    "prediction": frame["prediction"],
+                                    "confidence": round(frame["confidence"] * 100, 2)})
+    for decision in decisions:
+        record_attempt(decision["claimed_identity"], decision["prediction"], decision["access_granted"])
+        decision["confidence"] = round(decision["confidence"] * 100, 2)
+    response["decisions"] = decisions
+    response["access_granted"] = all(d["access_granted"] for d in decisions)
+    response["model_version"] = version
+    return jsonify(response), 200
+
+@app.route('/enroll', methods=["POST"])
+def enroll():
+    """
+    Enroll a user from one or more palm images without retraining. Needs the
+    admin token; an existing user is only re-enrolled with form field replace=1.
+    """
+    response = {"user_id": None, "enrolled_images": 0, "error": None, "model_version": None}
+
+    response["error"] = admin_denied()
+    if response["error"]:
+        return jsonify(response), 403
+
+    response["error"] = embeddings_unavailable()
+    if response["error"]:
+        return jsonify(response), 500
+
+    allow_multiple_uploads()
+    user_id = request.form.get("user_id")
+    if not user_id:
+        response["error"] = "No user ID given."
+        return jsonify(response), 400
+    response["user_id"] = user_id
+    replace = request.form.get("replace", "").lower() in ("1", "true", "yes")
+    templates.refresh()
+    if user_id in templates and not replace:
+        response["error"] = "User is already enrolled; send replace=1 to re-enroll."
+        return jsonify(response), 409
+
+    files = [f for f in request.files.getlist("file") if f.filename]
+    if not files:
+        response["error"] = "No file uploaded."
+        return jsonify(response), 400
+    if len(files) > BATCH_MAX_FRAMES:
+        response["error"] = f"At most {BATCH_MAX_FRAMES} images per request."
+        return jsonify(response), 400
+    if not all(allowed_file(f.filename) for f in files):
+        response["error"] = "Unsupported file type."
+        return jsonify(response), 415
+    try:
+        payloads = [read_upload(f) for f in files]
+    except UploadRejected as e:
+        response["error"] = str(e)
+        return jsonify(response), e.status
+
+    try:
+        results = [infer_bytes(image_bytes, embedding=True) for image_bytes in payloads]
+        embeddings = [embedding for embedding, _ in results]
+        versions = {version for _, version in results}
+        if len(versions) > 1:
+            response["error"] = "The model was reloaded during enrollment; try again."
+            return jsonify(response), 503
+        response["model_version"] = versions.pop()
+        templates.enroll(user_id, embeddings, replace=replace, version=response["model_version"])
+    except AlreadyEnrolled as e:
+        response["error"] = f"{e} Send replace=1 to re-enroll."
+        return jsonify(response), 409
+    except Exception as e:
+        response["error"] = f"Enrollment failed: {str(e)}"
+        return jsonify(response), 500
+
+    response["enrolled_images"] = len(embeddings)
+    return jsonify(response), 200
+
+@app.route('/identify', methods=["POST"])
+def identify():
+    """
+    1:N lookup: return the top-k enrolled users most similar to the uploaded palm.
+    """
+    response = {"matches": [], "identified": None, "latency_ms": None, "error": None, "model_version": None}
+
+    response["error"] = identify_denied()
+    if response["error"]:
+        return jsonify(response), 403
+
+    client = request.remote_addr or "unknown"
+    wait_time = identify_lookups.locked_for(client)
+    if wait_time:
+        response["error"] = f"Too many identification requests. Try again in {wait_time} seconds."
+        return jsonify(response), 429
+    identify_lookups.record_failure(client)
+
+    response["error"] = embeddings_unavailable()
+    if response["error"]:
+        return jsonify(response), 500
+
+    file = request.files.get("file")
+    if file is None or file.filename == "":
+        response["error"] = "No file uploaded."
+        return jsonify(response), 400
+    if not allowed_file(file.filename):
+        response["error"] = "Unsupported file type."
+        return jsonify(response), 415
+    try:
+        image_bytes = read_upload(file)
+    except UploadRejected as e:
+        response["error"] = str(e)
+        return jsonify(response), e.status
+
+    try:
+        top_k = min(max(int(request.form.get("top_k", IDENTIFY_TOP_K)), 1), IDENTIFY_MAX_TOP_K)
+    except ValueError:
+        response["error"] = "top_k must be an integer."
+        return jsonify(response), 400
+
+    try:
+        embedding, response["model_version"] = infer_bytes(image_bytes, embedding=True)
+        start = time.perf_counter()
+        index = get_identification_index(response["model_version"])
+        matches = index.search(embedding, k=top_k, budget_ms=IDENTIFY_BUDGET_MS)
+        response["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    except Exception as e:
+        response["error"] = f"Identification failed: {str(e)}"
+        return jsonify(response), 500
+
+    response["index"] = index.kind
+    response["matches"] = [{"user_id": user_id, "score": round(score, 4)} for user_id, score in matches]
+    if matches and matches[0][1] >= templates.threshold:
+        response["identified"] = matches[0][0]
+    return jsonify(response), 200
+
 # ----- Run App -----
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
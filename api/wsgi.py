@@ -0,0 +1,16 @@
+"""
+Production entry point for the authentication API.
+
+    gunicorn -c api/gunicorn.conf.py api.wsgi:app
+
+Any WSGI server can serve `app`; gunicorn.conf.py holds the recommended
+worker, thread and preload settings.
+"""
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.localapp import app
+
+application = app
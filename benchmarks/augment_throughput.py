@@ -0,0 +1,85 @@
+"""
+Input throughput of training augmentation: Keras ImageDataGenerator (as
+create_data_generators used before it moved to tf.data) against the batched
+tensor-op augmentation in utils/augment.py, at several levels of map parallelism.
+
+Only the input side is timed -- batches are pulled and discarded -- so the
+numbers are the ceiling each pipeline can feed a model at.
+
+Usage:
+    python benchmarks/augment_throughput.py
+    python benchmarks/augment_throughput.py --data-dir processed_dataset --batches 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tensorflow as tf
+from tensorflow.keras.preprocessing.image import ImageDataGenerator
+
+from utils.augment import ROTATION_RANGE, SHIFT_RANGE, ZOOM_RANGE, apply_augmentation
+
+
+def _images_per_second(batches, num_batches, batch_size, warmup=5):
+    iterator = iter(batches)
+    for _ in range(warmup):
+        next(iterator)
+    start = time.perf_counter()
+    for _ in range(num_batches):
+        next(iterator)
+    return num_batches * batch_size / (time.perf_counter() - start)
+
+
+def generator_batches(X, y, batch_size):
+    datagen = ImageDataGenerator(
+        rotation_range=ROTATION_RANGE,
+        zoom_range=ZOOM_RANGE,
+        width_shift_range=SHIFT_RANGE,
+        height_shift_range=SHIFT_RANGE,
+        horizontal_flip=True
+    )
+    return datagen.flow(X, y, batch_size=batch_size, shuffle=True)
+
+
+def batched_dataset(X, y, batch_size, parallel_calls):
+    ds = tf.data.Dataset.from_tensor_slices((X, y)).repeat().shuffle(512).batch(batch_size, drop_remainder=True)
+    return apply_augmentation(ds, num_parallel_calls=parallel_calls).prefetch(tf.data.AUTOTUNE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="Processed dataset to load (default: random images)")
+    parser.add_argument("--num-images", type=int, default=1024, help="Random images when no --data-dir")
+    parser.add_argument("--img-size", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--parallel", type=int, nargs="*", default=[1, 2, 4],
+                        help="num_parallel_calls values to try, AUTOTUNE is always included")
+    args = parser.parse_args()
+
+    if args.data_dir:
+        from utils.helperslocal import load_processed_images
+        X, y, _ = load_processed_images(args.data_dir, (args.img_size, args.img_size))
+    else:
+        rng = np.random.default_rng(0)
+        X = rng.random((args.num_images, args.img_size, args.img_size, 1), dtype=np.float32)
+        y = rng.integers(0, 10, args.num_images)
+    y = y.astype(np.int32)
+    print(f"{len(X)} images of {X.shape[1]}x{X.shape[2]}, batch size {args.batch_size}, {args.batches} batches, "
+          f"{os.cpu_count()} CPUs")
+
+    baseline = _images_per_second(generator_batches(X, y, args.batch_size), args.batches, args.batch_size)
+    print(f"{'ImageDataGenerator':<28}{baseline:>10.0f} img/s")
+    for parallel in args.parallel + [tf.data.AUTOTUNE]:
+        label = "AUTOTUNE" if parallel == tf.data.AUTOTUNE else parallel
+        rate = _images_per_second(batched_dataset(X, y, args.batch_size, parallel), args.batches, args.batch_size)
+        print(f"{f'batched, parallel={label}':<28}{rate:>10.0f} img/s  ({rate / baseline:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
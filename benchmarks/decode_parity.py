@@ -0,0 +1,81 @@
+"""
+Parity check for reduced-resolution JPEG decoding.
+
+Decodes every image twice -- full resolution (cv2.IMREAD_GRAYSCALE) and the
+DCT-domain reduced decode picked by reduced_decode_flag -- then compares
+decode time, pixel difference after resizing, and the model's predictions.
+
+Usage:
+    python benchmarks/decode_parity.py static/uploads/*.jpg
+    python benchmarks/decode_parity.py --data-dir processed_dataset --model results/models/final_model.h5
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from utils.helperslocal import load_image
+from utils.preprocess import file_decode_flag
+
+
+def _timed_load(path, img_size, reduced_decode):
+    start = time.perf_counter()
+    img = load_image(path, img_size, reduced_decode)
+    return img, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", nargs="*", help="Image files to check")
+    parser.add_argument("--data-dir", help="Check every .jpg under this folder as well")
+    parser.add_argument("--model", help="Keras model; when given, predictions are compared too")
+    parser.add_argument("--img-size", type=int, default=128)
+    args = parser.parse_args()
+
+    paths = list(args.images)
+    if args.data_dir:
+        paths += glob.glob(os.path.join(args.data_dir, "**", "*.jpg"), recursive=True)
+    if not paths:
+        parser.error("No images given.")
+
+    img_size = (args.img_size, args.img_size)
+    full, reduced, full_ms, reduced_ms, reduced_count = [], [], [], [], 0
+    for path in paths:
+        img, ms = _timed_load(path, img_size, reduced_decode=False)
+        full.append(img)
+        full_ms.append(ms)
+        img, ms = _timed_load(path, img_size, reduced_decode=True)
+        reduced.append(img)
+        reduced_ms.append(ms)
+        reduced_count += file_decode_flag(path, img_size) != cv2.IMREAD_GRAYSCALE
+
+    full, reduced = np.stack(full), np.stack(reduced)
+    pixel_mae = np.abs(full - reduced).mean(axis=(1, 2, 3)) * 255
+
+    print(f"Images checked:        {len(paths)} ({reduced_count} took the reduced path)")
+    print(f"Decode time full:      {np.mean(full_ms):.2f} ms/img")
+    print(f"Decode time reduced:   {np.mean(reduced_ms):.2f} ms/img")
+    print(f"Pixel MAE (0-255):     mean {pixel_mae.mean():.2f}, max {pixel_mae.max():.2f}")
+
+    if args.model:
+        from tensorflow.keras.models import load_model
+
+        model = load_model(args.model)
+        full_probs = model.predict(full, verbose=0)
+        reduced_probs = model.predict(reduced, verbose=0)
+        same_top1 = np.argmax(full_probs, axis=1) == np.argmax(reduced_probs, axis=1)
+        print(f"Top-1 agreement:       {same_top1.mean() * 100:.2f}% ({(~same_top1).sum()} changed)")
+        print(f"Max |prob delta|:      {np.abs(full_probs - reduced_probs).max():.4f}")
+        for path, same in zip(paths, same_top1):
+            if not same:
+                print(f"  prediction changed: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Closed-loop load test for POST /authenticate.
+
+Keeps --concurrency clients busy sending the same palm image and reports
+throughput and latency percentiles. Each request claims a fresh identity
+unless --claimed-identity is given, so the lockout never turns requests into
+cheap 429 responses. Start the server first, e.g.
+
+    python api/localapp.py                           # Flask dev server, :5000
+    gunicorn -c api/gunicorn.conf.py api.wsgi:app    # production mode, :8000
+
+Usage:
+    python benchmarks/load_test.py --url http://127.0.0.1:8000/authenticate --image static/uploads/001_1.jpg
+    python benchmarks/load_test.py --url http://127.0.0.1:5000/authenticate --concurrency 16 --requests 2000
+"""
+import argparse
+import os
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def multipart_body(fields, file_field, filename, data):
+    """
+    Encode form fields plus one file as multipart/form-data. Returns (body, content type).
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n'.encode() + data + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def send(url, image_name, image_bytes, claimed=None):
+    """
+    Send one request. Returns (latency in ms, HTTP status or None on connection error).
+    """
+    claimed = claimed or f"load-{uuid.uuid4().hex[:12]}"
+    body, content_type = multipart_body({"claimed_identity": claimed}, "file", image_name, image_bytes)
+    req = urllib.request.Request(url, data=body, headers={"Content-Type": content_type})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = None
+    return (time.perf_counter() - start) * 1000, status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/authenticate")
+    parser.add_argument("--image", required=True, help="Palm image to upload")
+    parser.add_argument("--claimed-identity", help="Identity to claim (default: a new one per request)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20, help="Requests sent (and ignored) before measuring")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+    image_name = os.path.basename(args.image)
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(lambda _: send(args.url, image_name, image_bytes, args.claimed_identity), range(args.warmup)))
+        start = time.perf_counter()
+        results = list(pool.map(lambda _: send(args.url, image_name, image_bytes, args.claimed_identity), range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = np.array([ms for ms, _ in results])
+    statuses = [status for _, status in results]
+    ok = sum(status == 200 for status in statuses)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"URL:            {args.url}")
+    print(f"Requests:       {len(results)} at concurrency {args.concurrency} ({ok} OK, {len(results) - ok} failed)")
+    if ok < len(results):
+        print(f"Statuses:       { {s: statuses.count(s) for s in set(statuses)} }")
+    print(f"Throughput:     {len(results) / elapsed:.1f} req/s")
+    print(f"Latency (ms):   p50 {p50:.1f}, p95 {p95:.1f}, p99 {p99:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Training step time of the CNN under each precision / compilation mode:
+float32 eager-graph, float32 + XLA, mixed bfloat16, mixed bfloat16 + XLA.
+
+Steps run on random in-memory batches so only the model is timed. bfloat16
+modes are skipped on CPUs without native bf16 (see model/models.py).
+
+Usage:
+    python benchmarks/train_step_time.py
+    python benchmarks/train_step_time.py --architecture mobilenet --batch-size 64 --steps 30
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import tensorflow as tf
+
+from model.models import DEFAULT_CONFIG, compile_model, configure_precision, cpu_supports_bf16, get_model
+
+MODES = (
+    ("float32", False, False),
+    ("float32 + XLA", False, True),
+    ("bfloat16", True, False),
+    ("bfloat16 + XLA", True, True),
+)
+
+
+def time_steps(config, X, y, steps, warmup):
+    tf.keras.backend.clear_session()
+    configure_precision(config)
+    model = compile_model(get_model(config, X.shape[1:], y.shape[1]), config)
+    batch_size = config["batch_size"]
+    ds = tf.data.Dataset.from_tensor_slices((X, y)).repeat().batch(batch_size, drop_remainder=True).prefetch(2)
+    # The warm-up epoch includes tracing and (with XLA) compilation
+    model.fit(ds, steps_per_epoch=warmup, epochs=1, verbose=0)
+    start = time.perf_counter()
+    model.fit(ds, steps_per_epoch=steps, epochs=1, verbose=0)
+    return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--architecture", default=DEFAULT_CONFIG["architecture"])
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_CONFIG["batch_size"])
+    parser.add_argument("--img-size", type=int, default=128)
+    parser.add_argument("--num-classes", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.batch_size * 8
+    X = rng.random((n, args.img_size, args.img_size, 1), dtype=np.float32)
+    y = tf.keras.utils.to_categorical(rng.integers(0, args.num_classes, n), args.num_classes)
+
+    bf16 = cpu_supports_bf16()
+    print(f"{args.architecture}, batch size {args.batch_size}, {os.cpu_count()} CPUs, "
+          f"native bfloat16: {'yes' if bf16 else 'no'}")
+    baseline = None
+    for name, mixed, jit in MODES:
+        if mixed and not bf16:
+            print(f"{name:<18}   skipped")
+            continue
+        config = dict(DEFAULT_CONFIG, architecture=args.architecture, batch_size=args.batch_size,
+                      mixed_precision=mixed, jit_compile=jit)
+        seconds = time_steps(config, X, y, args.steps, args.warmup)
+        baseline = baseline or seconds
+        print(f"{name:<18}{seconds * 1000:>8.1f} ms/step  {args.batch_size / seconds:>8.0f} img/s  "
+              f"({baseline / seconds:.2f}x)")
+    configure_precision({})
+
+
+if __name__ == "__main__":
+    main()
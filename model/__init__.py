@@ -0,0 +1 @@
+# Init for model module
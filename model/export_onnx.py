@@ -0,0 +1,71 @@
+"""
+Export the trained CNN to ONNX for the ONNX Runtime backend (utils/backends.py).
+
+The exported graph takes a (batch, 128, 128, 1) float32 input with a dynamic
+batch dimension. After export the script checks that ONNX Runtime reproduces
+the Keras predictions on a few random inputs and prints per-image latency for
+both engines.
+
+Usage:
+    python model/export_onnx.py
+    python model/export_onnx.py --model results/models/final_model.h5 --out results/models/final_model.onnx
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.backends import OnnxBackend
+
+
+def export_onnx(model, output_path, opset=13):
+    """
+    Write `model` to `output_path` as ONNX. Uses Keras 3's exporter when
+    available and tf2onnx directly otherwise.
+    """
+    if int(tf.keras.__version__.split(".")[0]) >= 3:
+        # Keras 3's exporter needs a model that has been called at least once
+        model(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32))
+        model.export(output_path, format="onnx")
+    else:
+        import tf2onnx
+
+        spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=output_path)
+
+
+def _ms_per_image(predict_fn, x, repeats=20):
+    predict_fn(x)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict_fn(x)
+    return (time.perf_counter() - start) * 1000 / (repeats * len(x))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the palm vein CNN to ONNX.")
+    parser.add_argument("--model", default=os.path.join("results", "models", "final_model.h5"))
+    parser.add_argument("--out", default=None, help="Output path (default: model path with .onnx)")
+    parser.add_argument("--opset", type=int, default=13)
+    args = parser.parse_args()
+
+    out_path = args.out or os.path.splitext(args.model)[0] + ".onnx"
+    model = tf.keras.models.load_model(args.model)
+    export_onnx(model, out_path, args.opset)
+    print(f"✅ Saved ONNX model to {out_path}")
+
+    x = np.random.default_rng(0).random((16,) + tuple(model.input_shape[1:]), dtype=np.float32)
+    backend = OnnxBackend(out_path, pool_size=1)
+    max_diff = np.abs(backend.predict_on_batch(x) - model.predict_on_batch(x)).max()
+    print(f"Max |Keras - ONNX| output difference: {max_diff:.2e}")
+    print(f"Keras:        {_ms_per_image(model.predict_on_batch, x):.3f} ms/img (batch of {len(x)})")
+    print(f"ONNX Runtime: {_ms_per_image(backend.predict_on_batch, x):.3f} ms/img (batch of {len(x)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Export the trained CNN to TFLite with post-training quantization.
+
+Writes a float16 and a full-integer int8 model next to the .h5 file (the int8
+model is calibrated on training images) and reports accuracy, top-1 agreement
+with the .h5 model, file size and CPU latency on the held-out test split.
+
+The split is read from the <model>_split.json that `python -m model.train`
+writes next to the model, so test images are never ones the model was trained
+on. Without that file the split is recomputed from the sorted file list, which
+only matches models trained by model.train on the same dataset.
+
+Usage:
+    python model/export_tflite.py --data-dir processed_dataset
+    python model/export_tflite.py --model results/models/final_model.h5 --data-dir processed_dataset --int8-io
+    python model/export_tflite.py --split results/models/final_model_split.json
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.backends import TFLiteBackend
+from utils.datapack import load_packed_entries
+from utils.preprocess import to_float_batch
+from utils.tf_pipeline import load_split, split_path_for, split_sources
+
+
+def representative_dataset(X, n_samples=200, seed=42):
+    """
+    Calibration generator for int8 conversion: one image per step.
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(X), min(n_samples, len(X)), replace=False)
+
+    def gen():
+        for i in rows:
+            yield [to_float_batch(X[i:i + 1, ..., 0])]
+    return gen
+
+
+def convert(model, mode, X_calib=None, int8_io=False):
+    """
+    Convert a Keras model to TFLite. mode is 'float32', 'float16' or 'int8'.
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset(X_calib)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        if int8_io:
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+    elif mode != "float32":
+        raise ValueError(f"Unsupported quantization mode: {mode}")
+    return converter.convert()
+
+
+def load_model_split(model_path, data_dir, split_path=None):
+    """
+    (class_names, splits) the model at `model_path` was trained with; see the module docstring.
+    """
+    split_path = split_path or split_path_for(model_path)
+    if os.path.exists(split_path):
+        return load_split(split_path)
+    print(f"⚠️ {split_path} not found: recomputing the split from '{data_dir}'. The test images may overlap the "
+          f"training data unless the model was trained by model.train on this dataset.")
+    return split_sources(data_dir)
+
+
+def load_entries(data_dir, entries):
+    """
+    uint8 images and labels for [(relative path, label), ...], read from the
+    dataset's pack (see utils/datapack.py); evaluate scales them per batch.
+    """
+    return load_packed_entries(data_dir, entries)
+
+
+def evaluate(predict_fn, X, batch_size=32):
+    """
+    Return (predicted class per image, mean latency in ms per image).
+    """
+    preds = []
+    start = time.perf_counter()
+    for i in range(0, len(X), batch_size):
+        preds.append(np.argmax(predict_fn(to_float_batch(X[i:i + batch_size, ..., 0])), axis=1))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(preds), elapsed * 1000 / max(len(X), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the palm vein CNN to quantized TFLite models.")
+    parser.add_argument("--model", default=os.path.join("results", "models", "final_model.h5"))
+    parser.add_argument("--data-dir", default="processed_dataset", help="Calibration and evaluation images")
+    parser.add_argument("--out-dir", default=None, help="Output folder (default: next to --model)")
+    parser.add_argument("--split", default=None, help="Train/val/test split file (default: <model>_split.json)")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    parser.add_argument("--int8-io", action="store_true", help="Use int8 model inputs/outputs instead of float32")
+    parser.add_argument("--report", default=os.path.join("results", "quantization_report.csv"))
+    args = parser.parse_args()
+
+    out_dir = args.out_dir or os.path.dirname(args.model)
+    base_name = os.path.splitext(os.path.basename(args.model))[0]
+    os.makedirs(out_dir, exist_ok=True)
+
+    model = tf.keras.models.load_model(args.model)
+    _, splits = load_model_split(args.model, args.data_dir, args.split)
+    X_test, y_test = load_entries(args.data_dir, splits["test"])
+    train = splits["train"]
+    X_calib, _ = load_entries(args.data_dir, [train[i] for i in np.random.default_rng(0).permutation(len(train))
+                                              [:args.calibration_samples]])
+
+    ref_preds, ref_ms = evaluate(model.predict_on_batch, X_test)
+    rows = [{
+        "Model": os.path.basename(args.model),
+        "Size (KB)": round(os.path.getsize(args.model) / 1024, 1),
+        "Accuracy": float(np.mean(ref_preds == y_test)),
+        "Accuracy delta": 0.0,
+        "Top-1 agreement": 1.0,
+        "Latency (ms/img)": round(ref_ms, 3),
+    }]
+
+    for mode in ("float16", "int8"):
+        path = os.path.join(out_dir, f"{base_name}_{mode}.tflite")
+        with open(path, "wb") as f:
+            f.write(convert(model, mode, X_calib, args.int8_io))
+        print(f"✅ Saved {mode} model to {path}")
+
+        preds, ms = evaluate(TFLiteBackend(path).predict_on_batch, X_test)
+        acc = float(np.mean(preds == y_test))
+        rows.append({
+            "Model": os.path.basename(path),
+            "Size (KB)": round(os.path.getsize(path) / 1024, 1),
+            "Accuracy": acc,
+            "Accuracy delta": acc - rows[0]["Accuracy"],
+            "Top-1 agreement": float(np.mean(preds == ref_preds)),
+            "Latency (ms/img)": round(ms, 3),
+        })
+
+    report = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    report.to_csv(args.report, index=False)
+    print(f"\nEvaluated on {len(y_test)} held-out images:")
+    print(report.to_string(index=False))
+    print(f"\nReport saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Importable model builders and training-precision settings.
+
+build_simple_cnn / get_model are the architectures from train_model.py.
+compile_model() compiles a model from the training `config` dict, which takes
+two optional performance keys on top of architecture/dropout/optimizer/...:
+
+    "jit_compile": True        # compile train/predict steps with XLA
+    "mixed_precision": True    # bfloat16 compute, float32 weights -- only
+                               # where the CPU has native bf16 (AVX512_BF16 / AMX)
+
+configure_precision(config) must run before the model is built.
+"""
+import tensorflow as tf
+from tensorflow.keras import layers, models
+from tensorflow.keras.applications import MobileNetV2
+
+DEFAULT_CONFIG = {
+    "architecture": "simple_cnn",
+    "dropout": 0.3,
+    "optimizer": "adam",
+    "batch_size": 32,
+    "learning_rate": 0.001,
+    "jit_compile": False,
+    "mixed_precision": False
+}
+
+# /proc/cpuinfo flags for native bfloat16 arithmetic; without them bf16 is emulated and slower than float32
+BF16_CPU_FLAGS = ("avx512_bf16", "amx_bf16")
+
+
+def cpu_supports_bf16(cpuinfo_path="/proc/cpuinfo"):
+    try:
+        with open(cpuinfo_path) as f:
+            for line in f:
+                if line.startswith("flags"):
+                    flags = line.split(":", 1)[1].split()
+                    return any(flag in flags for flag in BF16_CPU_FLAGS)
+    except OSError:
+        pass
+    return False
+
+
+def configure_precision(config):
+    """
+    Set the global Keras dtype policy from config["mixed_precision"] and
+    return its name. Mixed precision falls back to float32 (with a warning)
+    on CPUs without native bfloat16 support.
+    """
+    policy = "float32"
+    if config.get("mixed_precision", False):
+        if cpu_supports_bf16():
+            policy = "mixed_bfloat16"
+        else:
+            print("⚠️ mixed_precision requested but this CPU has no native bfloat16 support; using float32")
+    tf.keras.mixed_precision.set_global_policy(policy)
+    return policy
+
+
+def build_simple_cnn(input_shape, num_classes, dropout_rate=0.3):
+    model = tf.keras.Sequential([
+        tf.keras.layers.Conv2D(32, (3, 3), activation='relu', input_shape=input_shape),
+        tf.keras.layers.MaxPooling2D(2, 2),
+        tf.keras.layers.Dropout(dropout_rate),
+
+        tf.keras.layers.Conv2D(64, (3, 3), activation='relu'),
+        tf.keras.layers.MaxPooling2D(2, 2),
+        tf.keras.layers.Dropout(dropout_rate),
+
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(128, activation='relu'),
+        tf.keras.layers.Dropout(dropout_rate),
+        # float32 softmax keeps the loss stable under mixed precision
+        tf.keras.layers.Dense(num_classes, activation='softmax', dtype='float32')
+    ])
+    return model
+
+
+def get_model(config, input_shape, num_classes):
+    arch = config.get("architecture", "simple_cnn")
+    dropout = config.get("dropout", 0.3)
+
+    if arch == "simple_cnn":
+        return build_simple_cnn(input_shape, num_classes, dropout)
+
+    elif arch == "mobilenet":
+        base_model = MobileNetV2(include_top=False, input_shape=input_shape, weights=None)
+        model = models.Sequential([
+            base_model,
+            layers.GlobalAveragePooling2D(),
+            layers.Dropout(dropout),
+            layers.Dense(num_classes, activation='softmax', dtype='float32')
+        ])
+        return model
+
+    else:
+        raise ValueError(f"Unsupported architecture: {arch}")
+
+
+def make_optimizer(config):
+    optimizer = tf.keras.optimizers.get(config.get("optimizer", "adam"))
+    optimizer.learning_rate = config.get("learning_rate", 0.001)
+    return optimizer
+
+
+def compile_model(model, config):
+    model.compile(optimizer=make_optimizer(config), loss='categorical_crossentropy', metrics=['accuracy'],
+                  jit_compile=bool(config.get("jit_compile", False)))
+    return model
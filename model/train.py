@@ -0,0 +1,218 @@
+"""
+Training entry point with checkpoint/resume and early stopping.
+
+Settings come from TRAIN_CONFIG (the model `config` keys of model/models.py
+plus the run settings below), optionally overridden by a YAML file and then
+by command-line flags:
+
+    python -m model.train
+    python -m model.train --config train.yaml
+    python -m model.train --data-dir processed_dataset --epochs 100 --patience 8
+
+Every `checkpoint_every` epochs the weights, optimizer state, epoch counter
+and early-stopping state are written to `checkpoint_dir` with
+tf.train.CheckpointManager. Running the same command again resumes from the
+latest checkpoint (--fresh starts over). The train/val/test split is made once,
+on the first start, and kept in checkpoint_dir/split.json, so files added
+before a resume cannot move between splits; decoded images are cached in
+checkpoint_dir/tfcache. Training stops once val_loss has not
+improved for `patience` epochs; the best weights (kept in best_model_path)
+are saved to model_path at the end, with the train/val/test file lists in
+<model>_split.json beside it. best_model_path and the CSV log (log_path)
+default to best_model.h5 and training_log.csv inside checkpoint_dir, so they
+belong to the run being resumed.
+"""
+import argparse
+import os
+import sys
+
+import tensorflow as tf
+from tensorflow.keras.callbacks import Callback, CSVLogger, EarlyStopping, ModelCheckpoint
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model.models import DEFAULT_CONFIG, compile_model, configure_precision, get_model
+from utils.tf_pipeline import create_streaming_pipeline, load_split, save_split, split_path_for, split_sources
+
+TRAIN_CONFIG = dict(
+    DEFAULT_CONFIG,
+    data_dir="processed_dataset",
+    img_size=128,
+    augment=True,
+    epochs=50,
+    patience=5,
+    checkpoint_dir="results/checkpoints",
+    checkpoint_every=1,
+    max_checkpoints=3,
+    model_path="results/models/final_model.h5",
+    best_model_path=None,  # default: <checkpoint_dir>/best_model.h5
+    log_path=None          # default: <checkpoint_dir>/training_log.csv
+)
+
+
+def load_config(path=None, overrides=None):
+    """
+    TRAIN_CONFIG updated from the YAML mapping in `path`, then from `overrides`.
+    Unknown keys are rejected so a typo does not silently fall back to a default.
+    """
+    config = dict(TRAIN_CONFIG)
+    updates = {}
+    if path:
+        import yaml
+
+        with open(path) as f:
+            updates.update(yaml.safe_load(f) or {})
+    updates.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    unknown = sorted(set(updates) - set(config))
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(unknown)}")
+    config.update(updates)
+    config["best_model_path"] = config["best_model_path"] or os.path.join(config["checkpoint_dir"], "best_model.h5")
+    config["log_path"] = config["log_path"] or os.path.join(config["checkpoint_dir"], "training_log.csv")
+    return config
+
+
+class TrainingState(tf.Module):
+    """
+    Progress saved alongside the model: epochs completed and the
+    early-stopping best value and wait counter.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+        self.best = tf.Variable(float("inf"), dtype=tf.float64, trainable=False)
+        self.wait = tf.Variable(0, dtype=tf.int64, trainable=False)
+
+
+class ResumableEarlyStopping(EarlyStopping):
+    """
+    EarlyStopping on val_loss that continues from the best value and wait
+    counter of a restored TrainingState instead of starting over.
+    """
+
+    def __init__(self, state, patience):
+        super().__init__(monitor="val_loss", patience=patience, verbose=1)
+        self.state = state
+
+    def on_train_begin(self, logs=None):
+        super().on_train_begin(logs)
+        if int(self.state.epoch) > 0 and float(self.state.best) != float("inf"):
+            self.best = float(self.state.best)
+            self.wait = int(self.state.wait)
+
+
+class CheckpointCallback(Callback):
+    """
+    Record progress in `state` after every epoch and save a checkpoint every
+    `every` epochs, and on the last one.
+    """
+
+    def __init__(self, manager, state, early_stopping, every=1):
+        super().__init__()
+        self.manager = manager
+        self.state = state
+        self.early_stopping = early_stopping
+        self.every = max(1, every)
+        self.saved_epoch = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.state.epoch.assign(epoch + 1)
+        if self.early_stopping.best is not None:
+            self.state.best.assign(self.early_stopping.best)
+        self.state.wait.assign(self.early_stopping.wait)
+        if (epoch + 1) % self.every == 0 or self.model.stop_training:
+            self._save(epoch + 1)
+
+    def on_train_end(self, logs=None):
+        epoch = int(self.state.epoch)
+        if epoch and self.saved_epoch != epoch:
+            self._save(epoch)
+
+    def _save(self, epoch):
+        path = self.manager.save(checkpoint_number=epoch)
+        self.saved_epoch = epoch
+        print(f"💾 Checkpoint saved: {path}")
+
+
+def train(config, fresh=False):
+    """
+    Train (or resume training) a model as described by `config`; returns
+    the trained model, with the best weights seen restored.
+    """
+    for key in ("model_path", "best_model_path", "log_path"):
+        os.makedirs(os.path.dirname(config[key]) or ".", exist_ok=True)
+    os.makedirs(config["checkpoint_dir"], exist_ok=True)
+
+    # A resumed run must train on exactly the split it started with
+    split_path = os.path.join(config["checkpoint_dir"], "split.json")
+    if fresh or not os.path.exists(split_path):
+        save_split(split_path, *split_sources(config["data_dir"]))
+    split = load_split(split_path)
+
+    img_size = (config["img_size"], config["img_size"])
+    train_ds, val_ds, _, class_names = create_streaming_pipeline(
+        config["data_dir"], img_size, config["batch_size"], augment=config["augment"],
+        cache_dir=os.path.join(config["checkpoint_dir"], "tfcache"), split=split)
+
+    policy = configure_precision(config)
+    model = compile_model(get_model(config, img_size[::-1] + (1,), len(class_names)), config)
+    # Optimizer slots must exist before a checkpoint can restore into them
+    model.optimizer.build(model.trainable_variables)
+
+    state = TrainingState()
+    checkpoint = tf.train.Checkpoint(model=model, optimizer=model.optimizer, state=state)
+    manager = tf.train.CheckpointManager(checkpoint, config["checkpoint_dir"], max_to_keep=config["max_checkpoints"])
+    if manager.latest_checkpoint and not fresh:
+        checkpoint.restore(manager.latest_checkpoint).assert_existing_objects_matched()
+        print(f"🔁 Resuming from {manager.latest_checkpoint} (epoch {int(state.epoch)})")
+    resumed = int(state.epoch) > 0
+    print(f"Training {config['architecture']} on {len(class_names)} classes, precision {policy}, "
+          f"XLA {'on' if config.get('jit_compile') else 'off'}")
+
+    early_stopping = ResumableEarlyStopping(state, config["patience"])
+    best_value = float(state.best) if resumed else None
+    callbacks = [
+        early_stopping,
+        ModelCheckpoint(config["best_model_path"], monitor="val_loss", save_best_only=True,
+                        initial_value_threshold=best_value, verbose=1),
+        CheckpointCallback(manager, state, early_stopping, config["checkpoint_every"]),
+        CSVLogger(config["log_path"], append=resumed)
+    ]
+
+    if int(state.wait) >= config["patience"] or int(state.epoch) >= config["epochs"]:
+        print("✅ Training already finished in this checkpoint directory (use --fresh to start over)")
+    else:
+        model.fit(train_ds, validation_data=val_ds, epochs=config["epochs"], initial_epoch=int(state.epoch),
+                  callbacks=callbacks)
+
+    if os.path.exists(config["best_model_path"]):
+        model.load_weights(config["best_model_path"])
+    model.save(config["model_path"])
+    # Evaluation and export read the held-out test files from here
+    save_split(split_path_for(config["model_path"]), *split)
+    print(f"✅ Final model saved to {config['model_path']}")
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", help="YAML file with config overrides")
+    parser.add_argument("--data-dir")
+    parser.add_argument("--epochs", type=int)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--patience", type=int)
+    parser.add_argument("--checkpoint-dir")
+    parser.add_argument("--model-path")
+    parser.add_argument("--best-model-path", help="Default: <checkpoint-dir>/best_model.h5")
+    parser.add_argument("--log-path", help="Default: <checkpoint-dir>/training_log.csv")
+    parser.add_argument("--fresh", action="store_true", help="Ignore existing checkpoints and start over")
+    args = parser.parse_args()
+
+    overrides = {key: getattr(args, key) for key in ("data_dir", "epochs", "batch_size", "patience",
+                                                     "checkpoint_dir", "model_path", "best_model_path", "log_path")}
+    train(load_config(args.config, overrides), fresh=args.fresh)
+
+
+if __name__ == "__main__":
+    main()
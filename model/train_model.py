@@ -105,7 +105,9 @@ config = {
     "dropout": 0.3,
     "optimizer": "adam",
     "batch_size": 32,
-    "learning_rate": 0.001
+    "learning_rate": 0.001,
+    "jit_compile": False,      # XLA-compile the training step
+    "mixed_precision": False   # bfloat16 compute where the CPU supports it (see model/models.py)
 }
 
 with open('/content/veinsecure-palm-vein-authentication/utils/helpers.py', 'r') as f:
@@ -218,6 +220,11 @@ os.makedirs("results/logs", exist_ok=True)
 
 """### **Define and Compile Model**"""
 
+from model.models import configure_precision
+
+# Must run before the model is built; falls back to float32 without native bf16
+configure_precision(config)
+
 model = models.Sequential([
     layers.Input(shape=(128, 128, 1)),
     layers.Conv2D(32, (3, 3), activation='relu'),
@@ -226,9 +233,10 @@ model = models.Sequential([
     layers.MaxPooling2D(2, 2),
     layers.Flatten(),
     layers.Dense(128, activation='relu'),
-    layers.Dense(num_classes, activation='softmax')
+    layers.Dense(num_classes, activation='softmax', dtype='float32')
 ])
-model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'],
+              jit_compile=config["jit_compile"])
 
 """### **Setup logging**"""
 
@@ -316,6 +324,9 @@ print(log_df)
 
 from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
 
+# Note: these are only defined here, after training has run. `python -m model.train`
+# trains with early stopping, best-model saving and resumable checkpoints.
+
 # Paths
 checkpoint_path = "results/models/best_model.h5"
 
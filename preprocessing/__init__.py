@@ -0,0 +1 @@
+# Init for preprocessing module
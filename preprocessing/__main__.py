@@ -0,0 +1,38 @@
+"""
+Command-line entry point for dataset preprocessing.
+
+Usage:
+    python -m preprocessing "BMPD_Dataset/Birjand University Mobile Palmprint Database (BMPD)" processed_dataset
+    python -m preprocessing RAW_DIR OUT_DIR --size 224 --workers 8 --force
+"""
+import argparse
+
+from preprocessing.parallel import preprocess_dataset
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resize raw palm images to grayscale uint8 in parallel.")
+    parser.add_argument("raw_dir", help="Raw dataset folder (one sub-folder per user)")
+    parser.add_argument("out_dir", nargs="?", default="processed_dataset", help="Output folder (default: processed_dataset)")
+    parser.add_argument("--size", type=int, default=224, help="Output width and height in pixels (default: 224)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--clahe", action="store_true", help="Apply CLAHE contrast enhancement after resizing")
+    parser.add_argument("--full-decode", action="store_true", help="Decode JPEGs at full resolution before resizing")
+    parser.add_argument("--force", action="store_true", help="Reprocess images even if outputs are up to date")
+    args = parser.parse_args()
+
+    stats = preprocess_dataset(
+        args.raw_dir, args.out_dir,
+        size=(args.size, args.size),
+        workers=args.workers,
+        reduced_decode=not args.full_decode,
+        apply_clahe=args.clahe,
+        force=args.force,
+    )
+    print(f"✅ Processed {stats['processed']} images, skipped {stats['skipped']} up to date, "
+          f"{stats['failed']} failed in {stats['seconds']:.2f}s "
+          f"({stats['images_per_sec']:.1f} images/sec on {stats['workers']} workers) -> '{args.out_dir}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Parallel preprocessing of the raw BMPD tree.
+
+The file list is sharded across a process pool; each worker reads an image
+straight to a resized uint8 grayscale array and writes it back out, so no
+float copies are made. Outputs that are newer than both their source and the
+run's parameter file are skipped, which lets an interrupted run resume.
+CLAHE, when enabled, uses the per-worker operator from utils.preprocess.
+"""
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.preprocess import read_grayscale
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PARAMS_FILE = ".preprocess.json"
+
+_worker_config = {}
+
+
+def list_tasks(raw_dir, out_dir):
+    """
+    Return [(input path, output path), ...] for every image under `raw_dir`,
+    mirroring its folder structure under `out_dir`.
+    """
+    tasks = []
+    for root, _, files in os.walk(raw_dir):
+        for file in sorted(files):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                input_path = os.path.join(root, file)
+                rel_path = os.path.relpath(input_path, raw_dir)
+                tasks.append((input_path, os.path.join(out_dir, rel_path)))
+    return tasks
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def is_up_to_date(input_path, output_path, since_ns=0):
+    out_mtime = _mtime(output_path)
+    return out_mtime is not None and out_mtime >= max(_mtime(input_path) or 0, since_ns)
+
+
+def write_params(out_dir, params, force=False):
+    """
+    Record the run parameters in `out_dir`. The file is only rewritten when the
+    parameters change (or on --force); its mtime then marks every older output
+    as stale. Returns that mtime.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, PARAMS_FILE)
+    try:
+        with open(path) as f:
+            unchanged = json.load(f) == params
+    except (OSError, ValueError):
+        unchanged = False
+    if force or not unchanged:
+        with open(path, "w") as f:
+            json.dump(params, f)
+    return _mtime(path)
+
+
+def _init_worker(size, reduced_decode, apply_clahe):
+    _worker_config["size"] = size
+    _worker_config["reduced_decode"] = reduced_decode
+    _worker_config["apply_clahe"] = apply_clahe
+
+
+def process_image(task):
+    """
+    Read, resize and write one image. Returns True on success.
+    """
+    input_path, output_path = task
+    img = read_grayscale(input_path, _worker_config["size"], _worker_config["reduced_decode"],
+                         _worker_config["apply_clahe"])
+    if img is None:
+        print(f"[WARN] Could not load {input_path}")
+        return False
+
+    ok, encoded = cv2.imencode(os.path.splitext(output_path)[1], img)
+    if not ok:
+        print(f"[WARN] Could not encode {output_path}")
+        return False
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    # Write then rename, so an interrupted run never leaves a truncated output that looks up to date
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encoded.tobytes())
+    os.replace(tmp_path, output_path)
+    return True
+
+
+def preprocess_dataset(raw_dir, out_dir, size=(224, 224), workers=None, reduced_decode=True, apply_clahe=False,
+                       force=False):
+    """
+    Preprocess every image under `raw_dir` into `out_dir` using `workers` processes.
+    Returns a dict with processed / skipped / failed counts, elapsed seconds and images/sec.
+    """
+    workers = workers or os.cpu_count() or 1
+    params = {"size": list(size), "reduced_decode": reduced_decode, "apply_clahe": apply_clahe}
+    since_ns = write_params(out_dir, params, force)
+
+    all_tasks = list_tasks(raw_dir, out_dir)
+    tasks = [t for t in all_tasks if not is_up_to_date(*t, since_ns=since_ns)]
+    skipped = len(all_tasks) - len(tasks)
+
+    start = time.perf_counter()
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(size, reduced_decode, apply_clahe)
+        results = [process_image(t) for t in tasks]
+    else:
+        chunksize = max(1, len(tasks) // (workers * 8))
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(size, reduced_decode, apply_clahe)) as pool:
+            results = list(pool.imap_unordered(process_image, tasks, chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    processed = sum(results)
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": len(results) - processed,
+        "seconds": elapsed,
+        "images_per_sec": processed / elapsed if elapsed > 0 else 0.0,
+        "workers": workers,
+    }
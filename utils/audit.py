@@ -0,0 +1,221 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is not coordinated between processes
+    fcntl = None
+
+
+class UploadAuditWriter:
+    """
+    Saves uploaded images to an audit folder on a background thread.
+
+    Requests hand over the bytes they already hold in memory and return
+    immediately; the disk write happens off the request path. When more than
+    `max_pending` uploads are waiting, new ones are dropped (and counted)
+    rather than blocking logins.
+    """
+
+    def __init__(self, folder, max_pending=64):
+        self.folder = folder
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        os.makedirs(folder, exist_ok=True)
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="upload-audit", daemon=True)
+            self._worker.start()
+
+    def save(self, filename, data):
+        """
+        Queue `data` to be written as `filename`. Returns False if the upload was dropped.
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((filename, bytes(data)))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            filename, data = self._queue.get()
+            try:
+                with open(os.path.join(self.folder, filename), "wb") as f:
+                    f.write(data)
+            except OSError as e:
+                print(f"Upload audit write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """
+        Wait for queued uploads to be written.
+        """
+        if self._worker is not None and self._pid == os.getpid():
+            self._queue.join()
+
+
+class AuthLogWriter:
+    """
+    Appends authentication attempts to a log file from a background thread.
+
+    log() only timestamps the attempt and puts it on a bounded queue; the worker
+    writes everything that has queued up with a single write() and flush.
+    Before writing, it rotates the file if the batch would take it past
+    `max_bytes` or if its first entry is older than `max_age_seconds` (keeping
+    `backup_count` old files as path.1, path.2, ...). The age comes from the
+    file itself, so restarting the service does not postpone rotation. Audit records
+    are never dropped: if the disk falls `max_pending` entries behind, log()
+    waits. close() (also run at exit) returns once everything queued is written.
+
+    Lines are plain text by default, or one JSON object per line with
+    json_lines=True. Several processes (gunicorn workers) may share one file:
+    rotation happens under an flock and a writer reopens the file when another
+    process has rotated it.
+    """
+
+    def __init__(self, path, json_lines=False, max_bytes=10 * 2**20, backup_count=5,
+                 max_age_seconds=24 * 3600, max_pending=10000, max_batch=512):
+        self.path = path
+        self.json_lines = json_lines
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_age_seconds = max_age_seconds
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._file = None
+        self._started_at = None
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atexit.register(self.close)
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            # Entries queued by the parent before fork() belong to the parent
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._file = None
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="auth-log", daemon=True)
+            self._worker.start()
+
+    def log(self, claimed_id, predicted_id, status, note=None):
+        """
+        Queue one authentication attempt; the timestamp is taken now.
+        """
+        self._ensure_worker()
+        self._queue.put((datetime.now(), claimed_id, predicted_id, status, note))
+
+    def format(self, entry):
+        timestamp, claimed_id, predicted_id, status, note = entry
+        if self.json_lines:
+            return json.dumps({"time": timestamp.isoformat(timespec="milliseconds"), "claimed": claimed_id,
+                               "predicted": predicted_id, "access": status, "note": note}, default=str)
+        line = f"[{timestamp:%Y-%m-%d %H:%M:%S}] Claimed: {claimed_id}, Predicted: {predicted_id}, Access: {status}"
+        if note:
+            line += f" | Note: {note}"
+        return line
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._started_at = self._first_entry_time()
+
+    def _first_entry_time(self):
+        # Age of the file as a whole, not of this process: the timestamp of its first line
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                first = f.readline()
+        except OSError:
+            return time.time()
+        if not first.strip():
+            return time.time()
+        try:
+            if first.startswith("{"):
+                return datetime.fromisoformat(json.loads(first)["time"]).timestamp()
+            return datetime.strptime(first[1:20], "%Y-%m-%d %H:%M:%S").timestamp()
+        except (ValueError, KeyError, TypeError):
+            # Unrecognised first line: fall back to the last write
+            return os.stat(self.path).st_mtime
+
+    def _replaced(self):
+        # True when another process has rotated the file away from under us
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._file.fileno()).st_ino
+        except OSError:
+            return True
+
+    def _rotate(self):
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Another process may have rotated while we waited for the lock
+            if not self._replaced():
+                for i in range(self.backup_count - 1, 0, -1):
+                    src = f"{self.path}.{i}"
+                    if os.path.exists(src):
+                        os.replace(src, f"{self.path}.{i + 1}")
+                if self.backup_count > 0:
+                    os.replace(self.path, f"{self.path}.1")
+                else:
+                    os.remove(self.path)
+            self._open()
+        finally:
+            lock_file.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self._file is None or self._replaced():
+                    self._open()
+                data = "".join(self.format(entry) + "\n" for entry in batch)
+                size = self._file.tell()
+                if size and (size + len(data.encode("utf-8")) > self.max_bytes
+                             or time.time() - self._started_at >= self.max_age_seconds):
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+            except OSError as e:
+                print(f"Auth log write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def close(self):
+        """
+        Wait for queued attempts to be written.
+        """
+        if self._worker is not None and self._pid == os.getpid():
+            self._queue.join()
@@ -0,0 +1,97 @@
+"""
+Batched training augmentation as tensor ops.
+
+augment_batch() applies the transformations create_data_generators used to
+get from Keras ImageDataGenerator (rotation, zoom, shift, horizontal flip), plus
+brightness and contrast jitter, to a whole (B, H, W, C) batch at once: one
+random affine matrix per image, all warped in a single
+ImageProjectiveTransformV3 call. Mapped over a batched tf.data dataset it runs
+in the input pipeline's own threads, in parallel with training, instead of
+per image in Python on the main thread.
+
+    ds = apply_augmentation(ds.batch(32), num_parallel_calls=4)
+"""
+import math
+
+import tensorflow as tf
+
+# Same ranges as the ImageDataGenerator create_data_generators used
+ROTATION_RANGE = 10       # degrees
+ZOOM_RANGE = 0.1
+SHIFT_RANGE = 0.1         # fraction of width/height
+BRIGHTNESS_DELTA = 0.1
+CONTRAST_RANGE = (0.9, 1.1)
+
+
+def random_affine_transforms(batch_size, height, width, rotation_range=ROTATION_RANGE, zoom_range=ZOOM_RANGE,
+                             shift_range=SHIFT_RANGE, horizontal_flip=True):
+    """
+    (batch_size, 8) projective transforms for ImageProjectiveTransformV3, each
+    mapping output pixel coordinates back to input coordinates: a random
+    rotation, zoom and optional flip about the image centre followed by a
+    random shift.
+    """
+    shape = tf.stack([batch_size])
+    theta = tf.random.uniform(shape, -1.0, 1.0) * (rotation_range * math.pi / 180.0)
+    zoom_x = tf.random.uniform(shape, 1.0 - zoom_range, 1.0 + zoom_range)
+    zoom_y = tf.random.uniform(shape, 1.0 - zoom_range, 1.0 + zoom_range)
+    flip = tf.ones(shape)
+    if horizontal_flip:
+        flip = tf.where(tf.random.uniform(shape) < 0.5, -1.0, 1.0)
+    shift_x = tf.random.uniform(shape, -shift_range, shift_range) * tf.cast(width, tf.float32)
+    shift_y = tf.random.uniform(shape, -shift_range, shift_range) * tf.cast(height, tf.float32)
+
+    # input = centre + R(theta) @ diag(zoom_x * flip, zoom_y) @ (output - centre) + shift
+    cos, sin = tf.cos(theta), tf.sin(theta)
+    a0, a1 = cos * zoom_x * flip, -sin * zoom_y
+    b0, b1 = sin * zoom_x * flip, cos * zoom_y
+    cx = (tf.cast(width, tf.float32) - 1.0) / 2.0
+    cy = (tf.cast(height, tf.float32) - 1.0) / 2.0
+    a2 = cx - a0 * cx - a1 * cy + shift_x
+    b2 = cy - b0 * cx - b1 * cy + shift_y
+    zeros = tf.zeros(shape)
+    return tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+
+def random_affine(images, rotation_range=ROTATION_RANGE, zoom_range=ZOOM_RANGE, shift_range=SHIFT_RANGE,
+                  horizontal_flip=True, fill_mode="NEAREST"):
+    """
+    Warp every image of a float (B, H, W, C) batch with its own random affine
+    transform. fill_mode is one of NEAREST, REFLECT, WRAP, CONSTANT.
+    """
+    shape = tf.shape(images)
+    transforms = random_affine_transforms(shape[0], shape[1], shape[2], rotation_range, zoom_range, shift_range,
+                                          horizontal_flip)
+    return tf.raw_ops.ImageProjectiveTransformV3(images=images, transforms=transforms, output_shape=shape[1:3],
+                                                 fill_value=0.0, interpolation="BILINEAR", fill_mode=fill_mode)
+
+
+def random_brightness_contrast(images, max_delta=BRIGHTNESS_DELTA, contrast_range=CONTRAST_RANGE):
+    """
+    Per-image brightness shift and contrast scale for a (B, H, W, C) batch in [0, 1].
+    """
+    shape = tf.stack([tf.shape(images)[0], 1, 1, 1])
+    delta = tf.random.uniform(shape, -max_delta, max_delta)
+    factor = tf.random.uniform(shape, contrast_range[0], contrast_range[1])
+    mean = tf.reduce_mean(images, axis=[1, 2, 3], keepdims=True)
+    return tf.clip_by_value((images - mean) * factor + mean + delta, 0.0, 1.0)
+
+
+def augment_batch(images, labels, affine=True, color=True, **affine_kwargs):
+    """
+    Augment one batch of float images in [0, 1]; labels pass through unchanged.
+    """
+    if affine:
+        images = random_affine(images, **affine_kwargs)
+    if color:
+        images = random_brightness_contrast(images)
+    return images, labels
+
+
+def apply_augmentation(dataset, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False, **kwargs):
+    """
+    Map augment_batch over an already batched dataset, `num_parallel_calls`
+    batches at a time. Extra keyword arguments go to augment_batch.
+    """
+    return dataset.map(lambda images, labels: augment_batch(images, labels, **kwargs),
+                       num_parallel_calls=num_parallel_calls, deterministic=deterministic)
@@ -0,0 +1,195 @@
+"""
+Pluggable inference backends.
+
+Every backend exposes what the rest of the code uses on a Keras model --
+`input_shape`, `predict(x, verbose=0)` and `predict_on_batch(x)` -- so
+predict_image, predict_batch and the API's MicroBatcher work unchanged
+whichever engine serves the model.
+
+    keras   the .h5 model through TensorFlow Keras (load_backend returns the
+            Keras model itself)
+    tflite  a .tflite file (float32, float16 or int8 quantised, see
+            model/export_tflite.py) through the TFLite interpreter
+    onnx    a .onnx file (see model/export_onnx.py) through a pool of
+            ONNX Runtime CPU sessions
+
+The backend is chosen with VEINSECURE_BACKEND or, by default, from the model
+file extension. VEINSECURE_INTRA_OP_THREADS / VEINSECURE_INTER_OP_THREADS cap
+the CPU threads every backend uses (api/gunicorn.conf.py sets them per worker).
+"""
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+def cpu_thread_budget():
+    """
+    Threads one process may use inside an op: VEINSECURE_INTRA_OP_THREADS, or
+    all cores when unset.
+    """
+    return int(os.environ.get("VEINSECURE_INTRA_OP_THREADS") or os.cpu_count() or 1)
+
+
+def configure_tensorflow_threads():
+    """
+    Apply VEINSECURE_INTRA_OP_THREADS / VEINSECURE_INTER_OP_THREADS to
+    TensorFlow. Only takes effect before TensorFlow has run its first op.
+    """
+    import tensorflow as tf
+
+    try:
+        if os.environ.get("VEINSECURE_INTRA_OP_THREADS"):
+            tf.config.threading.set_intra_op_parallelism_threads(cpu_thread_budget())
+        if os.environ.get("VEINSECURE_INTER_OP_THREADS"):
+            tf.config.threading.set_inter_op_parallelism_threads(int(os.environ["VEINSECURE_INTER_OP_THREADS"]))
+    except RuntimeError:
+        # The runtime is already initialised; its thread pools are fixed now
+        pass
+
+
+def _tflite_interpreter_class():
+    # The standalone LiteRT / tflite runtimes are much lighter than full
+    # TensorFlow when installed; tf.lite is the fallback.
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+
+class TFLiteBackend:
+    """
+    Serves a .tflite model. The interpreter is not thread-safe, so calls are
+    serialised with a lock; the input tensor is resized when the batch size
+    changes. Int8 models with quantised inputs/outputs are (de)quantised here,
+    so callers always pass and receive float32.
+    """
+
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        Interpreter = _tflite_interpreter_class()
+        num_threads = num_threads or cpu_thread_budget()
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+        self.input_shape = (None,) + tuple(int(d) for d in self._input["shape"][1:])
+        self._lock = threading.Lock()
+
+    def _quantize(self, x):
+        scale, zero_point = self._input["quantization"]
+        if self._input["dtype"] == np.float32 or not scale:
+            return x.astype(self._input["dtype"], copy=False)
+        info = np.iinfo(self._input["dtype"])
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(self._input["dtype"])
+
+    def _dequantize(self, y):
+        scale, zero_point = self._output["quantization"]
+        if self._output["dtype"] == np.float32 or not scale:
+            return y.astype(np.float32, copy=False)
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict_on_batch(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        with self._lock:
+            if x.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], x.shape)
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = x.shape[0]
+            self.interpreter.set_tensor(self._input["index"], self._quantize(x))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output["index"])).copy()
+
+    def predict(self, x, verbose=0, batch_size=32):
+        x = np.asarray(x, dtype=np.float32)
+        return np.concatenate([self.predict_on_batch(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+
+class OnnxBackend:
+    """
+    Serves a .onnx model through a pool of ONNX Runtime CPU sessions.
+
+    Each call borrows a session from the pool (blocking while all are busy),
+    so the backend can be shared by Flask worker threads and at most
+    `pool_size` forward passes run at once. Sessions use full graph
+    optimisation and explicit intra-/inter-op thread counts so several of
+    them do not oversubscribe the cores.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path, pool_size=None, intra_op_threads=None, inter_op_threads=1):
+        import onnxruntime as ort
+
+        pool_size = pool_size or int(os.environ.get("VEINSECURE_ONNX_POOL_SIZE", 2))
+        if intra_op_threads is None:
+            intra_op_threads = max(1, cpu_thread_budget() // pool_size)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+
+        self.model_path = model_path
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"]))
+        session = self._pool.queue[0]
+        self._input_name = session.get_inputs()[0].name
+        self._output_name = session.get_outputs()[0].name
+        self.input_shape = tuple(d if isinstance(d, int) else None for d in session.get_inputs()[0].shape)
+
+    def predict_on_batch(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        session = self._pool.get()
+        try:
+            return session.run([self._output_name], {self._input_name: x})[0]
+        finally:
+            self._pool.put(session)
+
+    def predict(self, x, verbose=0, batch_size=32):
+        x = np.asarray(x, dtype=np.float32)
+        return np.concatenate([self.predict_on_batch(x[i:i + batch_size]) for i in range(0, len(x), batch_size)])
+
+
+_EXTENSION_BACKENDS = {".tflite": "tflite", ".onnx": "onnx"}
+
+
+def backend_for(model_path, backend=None):
+    """
+    Name of the backend that serves `model_path`: `backend` if given, else
+    picked from the file extension.
+    """
+    return backend or _EXTENSION_BACKENDS.get(os.path.splitext(model_path)[1].lower(), "keras")
+
+
+def load_backend(model_path, backend=None, **kwargs):
+    """
+    Load `model_path` with the named backend ('keras', 'tflite' or 'onnx'); by
+    default the backend is picked from the file extension.
+    """
+    backend = backend_for(model_path, backend)
+
+    if backend == "keras":
+        configure_tensorflow_threads()
+        from tensorflow.keras.models import load_model
+        return load_model(model_path)
+    if backend == "tflite":
+        return TFLiteBackend(model_path, **kwargs)
+    if backend == "onnx":
+        return OnnxBackend(model_path, **kwargs)
+    raise ValueError(f"Unsupported inference backend: {backend}")
@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-image inference requests into one batch.
+
+    Callers submit one preprocessed image of shape (H, W, C). A background
+    worker waits up to `max_wait_ms` for more requests (or until
+    `max_batch_size` are queued), runs a single forward pass through
+    `predict_fn` and resolves each caller's future with its own row.
+    `predict_fn` may return an array or any sequence with one item per image.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a batcher created in a parent
+        # process starts its own worker the first time a child uses it.
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, image):
+        """
+        Queue one image for inference and return a Future for its output row.
+        """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((np.asarray(image, dtype=np.float32), future))
+        return future
+
+    def predict(self, image, timeout=None):
+        """
+        Blocking helper: submit one image and wait for its prediction.
+        """
+        return self.submit(image).result(timeout=timeout)
+
+    def _collect(self):
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # Drop requests whose callers cancelled while they were queued
+            batch = [(x, f) for x, f in items if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [f for _, f in batch]
+            try:
+                outputs = self.predict_fn(np.stack([x for x, _ in batch]))
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            for f, row in zip(futures, outputs):
+                f.set_result(row)
@@ -0,0 +1,225 @@
+"""
+Packed uint8 cache for the processed palm dataset.
+
+`pack_dataset` decodes every image under a class-per-folder dataset once and
+writes three files next to it:
+
+    images.npy     uint8 array of shape (N, H, W), memory-mappable
+    labels.npy     int32 class index per image
+    manifest.json  image size, CLAHE and reduced-decode settings, class names and, per source file, its
+                   relative path, label, size, mtime and content hash
+
+`load_packed_images` memory-maps the pack and only rebuilds it when the
+source files no longer match the manifest; `load_packed_entries` reads the
+rows of a given file list (such as one train/val/test split).
+
+Usage:
+    python -m utils.datapack processed_dataset
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from utils.preprocess import APPLY_CLAHE, read_grayscale, to_float_batch
+
+PACK_VERSION = 3
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def default_pack_dir(data_dir):
+    # Kept beside (not inside) data_dir so the pack never shows up as a class folder
+    return os.path.normpath(data_dir) + "_pack"
+
+
+def hash_file(path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def list_sources(data_dir):
+    """
+    Return (class_names, [(relative path, class index), ...]) in sorted order.
+    Classes are the sub-folders of `data_dir`; files and hidden entries next to
+    them (e.g. the .preprocess.json written by preprocessing/parallel.py) are
+    not classes.
+    """
+    class_names = sorted(name for name in os.listdir(data_dir)
+                         if not name.startswith(".") and os.path.isdir(os.path.join(data_dir, name)))
+    sources = []
+    for class_idx, class_name in enumerate(class_names):
+        for img_file in sorted(os.listdir(os.path.join(data_dir, class_name))):
+            if img_file.lower().endswith(IMAGE_EXTENSIONS):
+                sources.append((os.path.join(class_name, img_file), class_idx))
+    return class_names, sources
+
+
+def _replace_npy(path, array):
+    tmp_path = path + ".tmp.npy"
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+def pack_dataset(data_dir, img_size=(128, 128), pack_dir=None, reduced_decode=True):
+    """
+    Decode `data_dir` once into a packed uint8 cache. Returns the manifest.
+    """
+    pack_dir = pack_dir or default_pack_dir(data_dir)
+    os.makedirs(pack_dir, exist_ok=True)
+    class_names, sources = list_sources(data_dir)
+
+    images = np.empty((len(sources), img_size[1], img_size[0]), dtype=np.uint8)
+    labels, entries = [], []
+    for rel_path, class_idx in sources:
+        path = os.path.join(data_dir, rel_path)
+        st = os.stat(path)
+        img = read_grayscale(path, img_size, reduced_decode)
+        if img is None:
+            print(f"[WARN] Could not load {path}")
+        else:
+            images[len(labels)] = img
+            labels.append(class_idx)
+        # Unreadable files are still recorded so they do not look "new" on the next load
+        entries.append({
+            "path": rel_path,
+            "label": class_idx,
+            "packed": img is not None,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": hash_file(path),
+        })
+
+    manifest = {
+        "version": PACK_VERSION,
+        "img_size": list(img_size),
+        "apply_clahe": APPLY_CLAHE,
+        "reduced_decode": reduced_decode,
+        "class_names": class_names,
+        "sources": entries,
+    }
+    _replace_npy(os.path.join(pack_dir, "images.npy"), images[:len(labels)])
+    _replace_npy(os.path.join(pack_dir, "labels.npy"), np.asarray(labels, dtype=np.int32))
+    # The manifest is written last, so an interrupted pack is never treated as current
+    manifest_path = os.path.join(pack_dir, "manifest.json")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def read_manifest(pack_dir):
+    try:
+        with open(os.path.join(pack_dir, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pack_is_current(data_dir, manifest, img_size=(128, 128), reduced_decode=True):
+    """
+    Check a manifest against the files currently in `data_dir`. Files whose
+    size and mtime are unchanged are trusted; the rest are re-hashed, so a
+    touched-but-identical file does not force a rebuild.
+    """
+    if manifest is None or manifest.get("version") != PACK_VERSION:
+        return False
+    if tuple(manifest["img_size"]) != tuple(img_size) or manifest.get("apply_clahe") != APPLY_CLAHE:
+        return False
+    if manifest.get("reduced_decode") != reduced_decode:
+        return False
+
+    class_names, sources = list_sources(data_dir)
+    if class_names != manifest["class_names"]:
+        return False
+    packed = {entry["path"]: entry for entry in manifest["sources"]}
+    if set(packed) != {rel_path for rel_path, _ in sources}:
+        return False
+
+    for rel_path, entry in packed.items():
+        path = os.path.join(data_dir, rel_path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]:
+            continue
+        if st.st_size != entry["size"] or hash_file(path) != entry["hash"]:
+            return False
+    return True
+
+
+def ensure_pack(data_dir, img_size=(128, 128), pack_dir=None, reduced_decode=True):
+    """
+    (Re)build the pack of `data_dir` if it is missing or stale. Returns (pack_dir, manifest).
+    """
+    pack_dir = pack_dir or default_pack_dir(data_dir)
+    manifest = read_manifest(pack_dir)
+    if not pack_is_current(data_dir, manifest, img_size, reduced_decode):
+        start = time.time()
+        manifest = pack_dataset(data_dir, img_size, pack_dir, reduced_decode)
+        print(f"Packed {len(manifest['sources'])} files into '{pack_dir}' in {time.time() - start:.2f}s")
+    return pack_dir, manifest
+
+
+def load_packed_images(data_dir, img_size=(128, 128), pack_dir=None, normalize=True, reduced_decode=True):
+    """
+    Drop-in replacement for load_processed_images backed by the packed cache.
+
+    The pack is (re)built when missing or stale. With normalize=False the images
+    are returned as a read-only uint8 memory map of shape (N, H, W, 1), which
+    costs no RAM up front; scale each batch with to_float_batch as it is used.
+    normalize=True returns the usual float32 array in [0, 1], which holds the
+    whole dataset in memory at four times the size of the pack.
+    """
+    pack_dir, manifest = ensure_pack(data_dir, img_size, pack_dir, reduced_decode)
+    X = np.load(os.path.join(pack_dir, "images.npy"), mmap_mode="r")[..., np.newaxis]
+    y = np.load(os.path.join(pack_dir, "labels.npy"))
+    if normalize:
+        X = to_float_batch(X[..., 0])
+    return X, y, manifest["class_names"]
+
+
+def load_packed_entries(data_dir, entries, img_size=(128, 128), pack_dir=None, reduced_decode=True):
+    """
+    uint8 (n, H, W, 1) images of the [(relative path, label), ...] `entries`
+    (e.g. one split from utils.tf_pipeline) read from the pack, plus their
+    labels. Entries whose file could not be decoded are skipped.
+    """
+    pack_dir, manifest = ensure_pack(data_dir, img_size, pack_dir, reduced_decode)
+    packed = [entry["path"] for entry in manifest["sources"] if entry["packed"]]
+    row_of = {rel_path: row for row, rel_path in enumerate(packed)}
+    rows = [row_of.get(rel_path) for rel_path, _ in entries]
+    keep = [i for i, row in enumerate(rows) if row is not None]
+    images = np.load(os.path.join(pack_dir, "images.npy"), mmap_mode="r")
+    X = np.asarray(images[[rows[i] for i in keep]])[..., np.newaxis]
+    return X, np.array([entries[i][1] for i in keep], dtype=np.int32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a processed palm dataset into a uint8 .npy cache.")
+    parser.add_argument("data_dir", help="Class-per-folder dataset, e.g. processed_dataset")
+    parser.add_argument("--pack-dir", help="Output folder (default: <data_dir>_pack)")
+    parser.add_argument("--img-size", type=int, default=128)
+    parser.add_argument("--full-decode", action="store_true", help="Decode JPEGs at full resolution before resizing")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the pack is current")
+    args = parser.parse_args()
+
+    img_size = (args.img_size, args.img_size)
+    pack_dir = args.pack_dir or default_pack_dir(args.data_dir)
+    reduced_decode = not args.full_decode
+    if not args.force and pack_is_current(args.data_dir, read_manifest(pack_dir), img_size, reduced_decode):
+        print(f"'{pack_dir}' is up to date.")
+        return
+    start = time.time()
+    manifest = pack_dataset(args.data_dir, img_size, pack_dir, reduced_decode)
+    print(f"Packed {len(manifest['sources'])} files into '{pack_dir}' in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Embedding-based 1:1 verification.
+
+The classifier's penultimate Dense(128) activations are used as a palm
+template. Each enrolled user has one L2-normalised float32 template row in a
+TemplateStore; a login is checked with a single cosine similarity against the
+claimed user's row, so new users can be enrolled without retraining.
+
+Templates only compare with embeddings from the model that produced them, so
+every row records that model's version. Checking a user against a different
+version raises StaleTemplate instead of returning a meaningless score; the
+user has to be re-enrolled with the current model.
+
+Build templates for a processed dataset and tune the threshold with:
+    python -m utils.embeddings processed_dataset --model results/models/final_model.h5
+"""
+import argparse
+import os
+import threading
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers in different processes are not coordinated
+    fcntl = None
+
+DEFAULT_THRESHOLD = 0.8
+EMBED_BATCH_SIZE = 64  # images per forward pass when enrolling a whole dataset
+
+
+class AlreadyEnrolled(ValueError):
+    pass
+
+
+class StaleTemplate(Exception):
+    """
+    The user's template was computed by another model version than the one asked about.
+    """
+
+
+def build_embedding_model(model):
+    """
+    Return a Keras model that maps images to the activations of the last Dense
+    layer before the classifier's softmax output.
+    """
+    import tensorflow as tf
+
+    dense_layers = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.Dense)]
+    if len(dense_layers) < 2:
+        raise ValueError("Model has no Dense layer before its output layer.")
+    return tf.keras.Model(inputs=model.inputs, outputs=dense_layers[-2].output)
+
+
+def l2_normalize(x, eps=1e-12):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, eps)
+
+
+class TemplateStore:
+    """
+    Enrollment templates as one contiguous (N, D) float32 matrix of unit
+    vectors plus parallel lists of user IDs and model versions (None when
+    unknown).
+
+    Updates build a new matrix and swap it in under a lock, so concurrent
+    readers always see a consistent (ids, matrix) pair without locking.
+    """
+
+    def __init__(self, ids=None, templates=None, threshold=DEFAULT_THRESHOLD, versions=None):
+        ids = list(ids or [])
+        dim = 0 if templates is None else np.asarray(templates).shape[-1]
+        templates = np.zeros((0, dim), np.float32) if templates is None else l2_normalize(templates)
+        versions = [None] * len(ids) if versions is None else list(versions)
+        if not len(ids) == len(templates) == len(versions):
+            raise ValueError("ids, templates and versions must have the same length.")
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._state = (ids, {user_id: i for i, user_id in enumerate(ids)}, np.ascontiguousarray(templates),
+                       versions)
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __contains__(self, user_id):
+        return user_id in self._state[1]
+
+    @property
+    def ids(self):
+        return list(self._state[0])
+
+    @property
+    def matrix(self):
+        return self._state[2]
+
+    def snapshot(self, version=None):
+        """
+        Consistent (ids, matrix) pair; the matrix object changes on every update.
+        With `version`, only the rows enrolled with that model version.
+        """
+        ids, _, matrix, versions = self._state
+        if version is None:
+            return list(ids), matrix
+        rows = [i for i, other in enumerate(versions) if other == version]
+        return [ids[i] for i in rows], np.ascontiguousarray(matrix[rows])
+
+    def version_of(self, user_id):
+        """
+        Model version the template of `user_id` was computed with. Raises KeyError if not enrolled.
+        """
+        _, index, _, versions = self._state
+        return versions[index[user_id]]
+
+    def enroll(self, user_id, embeddings, replace=True, version=None):
+        """
+        Enroll (or re-enroll) `user_id` from one or more embeddings of shape (D,) or (K, D)
+        computed by model `version`. The template is the normalised mean of the
+        normalised samples. With replace=False an existing template is kept and
+        AlreadyEnrolled is raised.
+        """
+        template = l2_normalize(l2_normalize(np.atleast_2d(embeddings)).mean(axis=0))
+        with self._lock:
+            ids, index, matrix, versions = self._state
+            if user_id in index and not replace:
+                raise AlreadyEnrolled(f"User {user_id} is already enrolled.")
+            if matrix.shape[0] and matrix.shape[1] != template.shape[0]:
+                raise ValueError(f"Embedding size {template.shape[0]} does not match store size {matrix.shape[1]}.")
+            if user_id in index:
+                matrix = matrix.copy()
+                matrix[index[user_id]] = template
+                versions = list(versions)
+                versions[index[user_id]] = version
+            else:
+                ids = ids + [user_id]
+                index = {**index, user_id: len(ids) - 1}
+                matrix = np.vstack([matrix.reshape(-1, template.shape[0]), template[np.newaxis]])
+                versions = versions + [version]
+            self._state = (ids, index, np.ascontiguousarray(matrix, dtype=np.float32), versions)
+
+    def remove(self, user_id):
+        with self._lock:
+            ids, index, matrix, versions = self._state
+            if user_id not in index:
+                return False
+            keep = [i for i, other in enumerate(ids) if other != user_id]
+            ids = [ids[i] for i in keep]
+            self._state = (ids, {u: i for i, u in enumerate(ids)}, np.ascontiguousarray(matrix[keep]),
+                           [versions[i] for i in keep])
+            return True
+
+    def similarity(self, user_id, embedding, version=None):
+        """
+        Cosine similarity between `embedding` and the template of `user_id`.
+        Raises KeyError if the user is not enrolled, and StaleTemplate if
+        `version` is given and the template was computed by another model.
+        """
+        _, index, matrix, versions = self._state
+        row = index[user_id]
+        if version is not None and versions[row] != version:
+            raise StaleTemplate(f"User {user_id} was enrolled with model version {versions[row] or 'unknown'}, "
+                                f"not the serving version {version}; re-enroll the user.")
+        return float(matrix[row] @ l2_normalize(embedding))
+
+    def verify(self, user_id, embedding, threshold=None, version=None):
+        """
+        Return (accepted, score) for a claimed identity.
+        """
+        score = self.similarity(user_id, embedding, version)
+        return score >= (self.threshold if threshold is None else threshold), score
+
+    def save(self, path):
+        with self._lock:
+            ids, _, matrix, versions = self._state
+            tmp_path = path + ".tmp.npz"
+            np.savez(tmp_path, ids=np.array(ids, dtype=str), templates=matrix, threshold=np.float32(self.threshold),
+                     versions=np.array([version or "" for version in versions], dtype=str))
+            os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, threshold=None):
+        with np.load(path) as data:
+            stored_threshold = float(data["threshold"]) if "threshold" in data else DEFAULT_THRESHOLD
+            # Files written before versions were recorded: every template is stale
+            versions = [str(v) or None for v in data["versions"]] if "versions" in data else None
+            return cls([str(i) for i in data["ids"]], data["templates"],
+                       stored_threshold if threshold is None else threshold, versions)
+
+
+class SharedTemplateStore(TemplateStore):
+    """
+    TemplateStore kept in sync with an .npz file shared by several processes
+    (e.g. gunicorn workers).
+
+    refresh() reloads the file when another process has replaced it; it is
+    one os.stat() when nothing changed. enroll() and remove() take an
+    exclusive lock on <path>.lock, re-read the file, apply the change and save,
+    so concurrent writers never drop each other's enrollments. With
+    threshold=None the threshold stored in the file is used.
+    """
+
+    def __init__(self, path, threshold=None):
+        super().__init__(threshold=DEFAULT_THRESHOLD if threshold is None else threshold)
+        self.path = path
+        self._fixed_threshold = threshold
+        self._file_state = None
+        self.refresh()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def refresh(self):
+        """
+        Pick up changes other processes have saved. Returns True if the store was reloaded.
+        """
+        file_state = self._stat()
+        if file_state is None or file_state == self._file_state:
+            return False
+        loaded = TemplateStore.load(self.path, self._fixed_threshold)
+        with self._lock:
+            self._state = loaded._state
+            self.threshold = loaded.threshold
+            self._file_state = file_state
+        return True
+
+    def _update(self, change):
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self.refresh()
+            result = change()
+            self.save(self.path)
+            self._file_state = self._stat()
+            return result
+        finally:
+            lock_file.close()
+
+    def enroll(self, user_id, embeddings, replace=True, version=None):
+        return self._update(lambda: TemplateStore.enroll(self, user_id, embeddings, replace, version))
+
+    def remove(self, user_id):
+        return self._update(lambda: TemplateStore.remove(self, user_id))
+
+
+def tune_threshold(genuine_scores, impostor_scores):
+    """
+    Pick the threshold at the equal error rate of genuine vs impostor cosine scores.
+    Returns (threshold, eer).
+    """
+    genuine = np.sort(np.asarray(genuine_scores, dtype=np.float64))
+    impostor = np.sort(np.asarray(impostor_scores, dtype=np.float64))
+    candidates = np.unique(np.concatenate([genuine, impostor]))
+    # Rejecting a genuine score below t / accepting an impostor score at or above t
+    frr = np.searchsorted(genuine, candidates, side="left") / len(genuine)
+    far = 1.0 - np.searchsorted(impostor, candidates, side="left") / len(impostor)
+    best = int(np.argmin(np.abs(frr - far)))
+    return float(candidates[best]), float((frr[best] + far[best]) / 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll every class of a processed dataset and tune the verification threshold.")
+    parser.add_argument("data_dir", help="Class-per-folder dataset, e.g. processed_dataset")
+    parser.add_argument("--model", default=os.path.join("results", "models", "final_model.h5"))
+    parser.add_argument("--out", default=os.path.join("results", "models", "templates.npz"))
+    parser.add_argument("--enroll-fraction", type=float, default=0.5,
+                        help="Share of each user's images used for enrollment; the rest tune the threshold")
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+    from utils.helperslocal import load_processed_images
+    from utils.model_registry import file_version
+    from utils.preprocess import to_float_batch
+
+    # uint8 memory map of the pack; only one batch at a time is scaled to float32
+    X, y, class_names = load_processed_images(args.data_dir, normalize=False)
+    embedding_model = build_embedding_model(load_model(args.model))
+    embeddings = l2_normalize(np.concatenate([
+        np.asarray(embedding_model.predict_on_batch(to_float_batch(X[i:i + EMBED_BATCH_SIZE, ..., 0])))
+        for i in range(0, len(X), EMBED_BATCH_SIZE)]))
+
+    version = file_version(args.model)
+    rng = np.random.default_rng(42)
+    store, probes, probe_labels = TemplateStore(), [], []
+    for class_idx in np.unique(y):
+        rows = rng.permutation(np.flatnonzero(y == class_idx))
+        n_enroll = max(1, int(round(len(rows) * args.enroll_fraction)))
+        store.enroll(class_names[class_idx], embeddings[rows[:n_enroll]], version=version)
+        probes.append(embeddings[rows[n_enroll:]])
+        probe_labels += [class_names[class_idx]] * (len(rows) - n_enroll)
+
+    probes = np.concatenate(probes)
+    if len(probes):
+        scores = probes @ store.matrix.T
+        genuine = np.array([store.ids.index(label) for label in probe_labels])[:, np.newaxis] == np.arange(len(store))
+        store.threshold, eer = tune_threshold(scores[genuine], scores[~genuine])
+        print(f"Threshold {store.threshold:.4f} (EER {eer * 100:.2f}% on {len(probes)} probes)")
+    store.save(args.out)
+    print(f"✅ Enrolled {len(store)} users -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
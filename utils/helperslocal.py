@@ -1,5 +1,4 @@
 import os
-import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 import tensorflow as tf
@@ -7,30 +6,71 @@ from sklearn.model_selection import train_test_split
 from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.utils import to_categorical
 
+from utils.augment import apply_augmentation
+from utils.datapack import list_sources, load_packed_images
+from utils.preprocess import imdecode_grayscale, imread_grayscale, preprocess_batch, resize_and_enhance
 
-def load_processed_images(data_dir, img_size=(128, 128)):
-    X, y = [], []
-    class_names = sorted(os.listdir(data_dir))
-
-    for class_idx, class_name in enumerate(class_names):
-        class_path = os.path.join(data_dir, class_name)
-        if os.path.isdir(class_path):
-            for img_file in os.listdir(class_path):
-                if img_file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    img_path = os.path.join(class_path, img_file)
-                    img = cv2.imread(img_path, cv2.IMREAD_GRAYSCALE)
-                    if img is not None:
-                        img = cv2.resize(img, img_size)
-                        img = img.astype('float32') / 255.0
-                        X.append(img)
-                        y.append(class_idx)
-
-    X = np.expand_dims(np.array(X), -1)
-    y = np.array(y)
+LOAD_CHUNK_SIZE = 256
+
+
+def load_processed_images(data_dir, img_size=(128, 128), reduced_decode=True, use_pack=True, pack_dir=None,
+                          normalize=True):
+    """
+    Load every class folder under `data_dir` as (N, H, W, 1) images: float32 in
+    [0, 1], or uint8 with normalize=False. By default the images come from a
+    packed uint8 cache (see utils/datapack.py) that is rebuilt only when the
+    source files change; with normalize=False that is a memory map, so scale
+    each batch with to_float_batch as it is used instead of the whole array.
+    use_pack=False decodes every file instead.
+    """
+    if use_pack:
+        return load_packed_images(data_dir, img_size, pack_dir=pack_dir, normalize=normalize,
+                                  reduced_decode=reduced_decode)
+
+    # Same sorted file order as the pack, so both paths give identical rows (and splits)
+    class_names, sources = list_sources(data_dir)
+    X, loaded = load_image_files([os.path.join(data_dir, rel_path) for rel_path, _ in sources],
+                                 img_size, reduced_decode, normalize)
+    y = np.array([sources[i][1] for i in loaded])
     return X, y, class_names
 
 
-def create_data_generators(X, y_encoded, batch_size=32, augment=True):
+def load_image_files(file_paths, img_size=(128, 128), reduced_decode=True, normalize=True):
+    """
+    Decode image files into one (N, H, W, 1) float32 array (uint8 with
+    normalize=False). Files are decoded in chunks that are resized and scaled
+    straight into the output. Returns (X, indices of the files that could be
+    read); unreadable files are skipped.
+    """
+    dtype = np.float32 if normalize else np.uint8
+    X = np.empty((len(file_paths), img_size[1], img_size[0], 1), dtype=dtype)
+    loaded = []
+    for start in range(0, len(file_paths), LOAD_CHUNK_SIZE):
+        chunk = []
+        for i in range(start, min(start + LOAD_CHUNK_SIZE, len(file_paths))):
+            img = imread_grayscale(file_paths[i], img_size, reduced_decode)
+            if img is None:
+                print(f"[WARN] Could not load {file_paths[i]}")
+            else:
+                chunk.append(img)
+                loaded.append(i)
+        out = X[len(loaded) - len(chunk):len(loaded)]
+        if normalize:
+            preprocess_batch(chunk, img_size, out=out)
+        else:
+            for img, row in zip(chunk, out):
+                resize_and_enhance(img, img_size, out=row[..., 0])
+    return X[:len(loaded)], loaded
+
+
+def create_data_generators(X, y_encoded, batch_size=32, augment=True, buffer_size=512):
+    """
+    Stratified 70/15/15 train/val/test split of X and one-hot labels as batched
+    tf.data datasets (formerly Keras ImageDataGenerator iterators). Training
+    batches are shuffled and, with augment=True, get the same rotation, zoom,
+    shift and flip through utils/augment.py, applied to whole batches in the
+    input pipeline; val and test batches keep their order.
+    """
     y_cat = to_categorical(y_encoded)
 
     X_train, X_temp, y_train, y_temp = train_test_split(
@@ -41,22 +81,22 @@ def create_data_generators(X, y_encoded, batch_size=32, augment=True):
     X_val, X_test, y_val, y_test = train_test_split(
         X_temp, y_temp, stratify=y_temp_enc, test_size=0.5, random_state=42)
 
-    if augment:
-        train_aug = ImageDataGenerator(
-            rotation_range=10,
-            zoom_range=0.1,
-            width_shift_range=0.1,
-            height_shift_range=0.1,
-            horizontal_flip=True
-        )
-    else:
-        train_aug = ImageDataGenerator()
-
-    test_aug = ImageDataGenerator()
+    def prepare_ds(X, y, training=False):
+        ds = tf.data.Dataset.from_tensor_slices((X, y))
+        if training:
+            ds = ds.shuffle(buffer_size)
+        ds = ds.batch(batch_size)
+        if X.dtype == np.uint8:
+            # load_processed_images(normalize=False): scale one batch at a time
+            ds = ds.map(lambda images, labels: (tf.cast(images, tf.float32) / 255.0, labels))
+        if training and augment:
+            # Geometric transforms only, as ImageDataGenerator was configured
+            ds = apply_augmentation(ds, color=False)
+        return ds.prefetch(tf.data.AUTOTUNE)
 
-    train_gen = train_aug.flow(X_train, y_train, batch_size=batch_size, shuffle=True)
-    val_gen = test_aug.flow(X_val, y_val, batch_size=batch_size, shuffle=False)
-    test_gen = test_aug.flow(X_test, y_test, batch_size=batch_size, shuffle=False)
+    train_gen = prepare_ds(X_train, y_train, training=True)
+    val_gen = prepare_ds(X_val, y_val)
+    test_gen = prepare_ds(X_test, y_test)
 
     return train_gen, val_gen, test_gen
 
@@ -72,18 +112,16 @@ def create_tf_data_pipeline(X, y_encoded, batch_size=32, buffer_size=512, augmen
     X_val, X_test, y_val, y_test = train_test_split(
         X_temp, y_temp, stratify=y_temp_enc, test_size=0.5, random_state=42)
 
-    def augment_fn(image, label):
-        image = tf.image.random_flip_left_right(image)
-        image = tf.image.random_brightness(image, max_delta=0.1)
-        image = tf.image.random_contrast(image, 0.9, 1.1)
-        return image, label
-
     def prepare_ds(X, y, training=False):
         ds = tf.data.Dataset.from_tensor_slices((X, y))
+        ds = ds.shuffle(buffer_size).batch(batch_size)
+        if X.dtype == np.uint8:
+            # load_processed_images(normalize=False): scale one batch at a time
+            ds = ds.map(lambda images, labels: (tf.cast(images, tf.float32) / 255.0, labels))
         if training and augment:
-            ds = ds.map(augment_fn, num_parallel_calls=tf.data.AUTOTUNE)
-        ds = ds.shuffle(buffer_size).batch(batch_size).prefetch(tf.data.AUTOTUNE)
-        return ds
+            # Whole-batch affine + brightness/contrast, see utils/augment.py
+            ds = apply_augmentation(ds)
+        return ds.prefetch(tf.data.AUTOTUNE)
 
     train_ds = prepare_ds(X_train, y_train, training=True)
     val_ds   = prepare_ds(X_val, y_val, training=False)
@@ -93,7 +131,7 @@ def create_tf_data_pipeline(X, y_encoded, batch_size=32, buffer_size=512, augmen
 
 
 def visualize_batch(generator_or_dataset, class_names, framework='keras'):
-    if framework == 'keras':
+    if framework == 'keras' and not isinstance(generator_or_dataset, tf.data.Dataset):
         images, labels = next(generator_or_dataset)
     else:
         for images, labels in generator_or_dataset.take(1):
@@ -127,40 +165,112 @@ def build_test_generator(batch_size=32, shuffle=False, target_size=(128, 128), c
     return test_gen, class_names
 
 
-def predict_image(file_path, model, class_names, img_size=(128, 128)):
+def load_image(file_path, img_size=(128, 128), reduced_decode=True):
     """
-    Predict class of a single palm image.
+    Read a palm image from disk and return it as a (H, W, 1) float32 array.
+    Large JPEGs are decoded at 1/2, 1/4 or 1/8 scale when that still covers `img_size`.
     """
-    img = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+    img = imread_grayscale(file_path, img_size, reduced_decode)
     if img is None:
         raise ValueError("Could not read image. Check file path.")
-    
-    img = cv2.resize(img, img_size).astype('float32') / 255.0
-    img = np.expand_dims(img, axis=(0, -1))  # Shape: (1, 128, 128, 1)
+    return preprocess_batch([img], img_size)[0]  # Shape: (128, 128, 1)
 
-    pred_probs = model.predict(img)
-    pred_class_idx = np.argmax(pred_probs)
-    pred_class_name = class_names[pred_class_idx]
 
+def decode_image_bytes(buf, img_size=(128, 128), reduced_decode=True):
+    """
+    Decode an encoded palm image held in memory (bytes, bytearray or memoryview)
+    and return it as a (H, W, 1) float32 array, without touching the disk.
+    """
+    img = imdecode_grayscale(buf, img_size, reduced_decode)
+    if img is None:
+        raise ValueError("Could not decode image. Check the uploaded file.")
+    return preprocess_batch([img], img_size)[0]
+
+
+def decode_image_batch(bufs, img_size=(128, 128), reduced_decode=True, map_fn=map):
+    """
+    Decode several encoded images into one (N, H, W, 1) float32 batch. The
+    decodes go through `map_fn` (e.g. a thread pool's map); resizing and
+    scaling are done once for the whole batch.
+    """
+    images = list(map_fn(lambda buf: imdecode_grayscale(buf, img_size, reduced_decode), bufs))
+    if any(img is None for img in images):
+        raise ValueError("Could not decode image. Check the uploaded file.")
+    return preprocess_batch(images, img_size)
+
+
+def predict_batch(images, model):
+    """
+    Run one forward pass over a stacked (N, H, W, 1) batch and return the class probabilities.
+    """
+    return np.asarray(model.predict_on_batch(images))
+
+
+def decode_prediction(pred_probs, class_names):
+    """
+    Turn one row of class probabilities into (class index, class name, confidence).
+    """
+    pred_class_idx = int(np.argmax(pred_probs))
+    pred_class_name = class_names[pred_class_idx]
     return pred_class_idx, pred_class_name, float(np.max(pred_probs))
 
 
+def fuse_predictions(pred_probs, class_names):
+    """
+    Combine several frames of the same palm: decode the mean of their class
+    probabilities, (N, num_classes) -> (class index, class name, confidence).
+    """
+    return decode_prediction(np.mean(pred_probs, axis=0), class_names)
+
+
+def predict_image(file_path, model, class_names, img_size=(128, 128), reduced_decode=True):
+    """
+    Predict class of a single palm image.
+    """
+    img = load_image(file_path, img_size, reduced_decode)
+    img = np.expand_dims(img, axis=0)  # Shape: (1, 128, 128, 1)
+
+    pred_probs = model.predict(img)
+    return decode_prediction(pred_probs[0], class_names)
+
+
+def predict_image_bytes(buf, model, class_names, img_size=(128, 128), reduced_decode=True):
+    """
+    Predict class of a single palm image given its encoded bytes.
+    """
+    img = np.expand_dims(decode_image_bytes(buf, img_size, reduced_decode), axis=0)
+
+    pred_probs = model.predict(img)
+    return decode_prediction(pred_probs[0], class_names)
+
+
 # 🔹 FINAL ADDITIONS FOR FLASK API (LOCAL USE) 🔹
 
-# Load model once at module level
-#model = tf.keras.models.load_model("final_model.h5")
-import os
-model_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'results', 'models', 'final_model.h5'))
-model = tf.keras.models.load_model(model_path)
+# The model is no longer loaded at import time: utils.model_registry loads it on
+# first use, once per process, and shares it with the API.
+# VEINSECURE_MODEL_PATH / VEINSECURE_BACKEND ("keras", "tflite" or "onnx") select
+# the file and inference engine; see utils/backends.py.
+from utils.model_registry import DEFAULT_MODEL_PATH, get_model
+model_path = os.environ.get("VEINSECURE_MODEL_PATH") or DEFAULT_MODEL_PATH
+model_backend = os.environ.get("VEINSECURE_BACKEND") or None
+
+
+def __getattr__(name):
+    # Keeps `from utils.helperslocal import model` working, loading lazily
+    if name == "model":
+        return get_model(model_path, model_backend)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Define static class name mapping (Person01 to Person50)
 class_names = [f"{i:03d}" for i in range(1, 42)]  # '001' to '041'
 
 def predict_image_flask(file_path):
     """
-    Wrapper for Flask API. Accepts a file path, uses preloaded model and class names,
+    Wrapper for Flask API. Accepts a file path, uses the shared model and class names,
     and returns prediction in dictionary format.
     """
+    model = get_model(model_path, model_backend)
     pred_idx, pred_name, confidence = predict_image(file_path, model, class_names)
     return {
         "predicted_class": pred_name,
@@ -0,0 +1,86 @@
+import io
+import struct
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+# JPEG start-of-frame markers carry the image dimensions (DHT/JPG/DAC excluded)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def sniff_format(head):
+    """
+    Identify an encoded image from its first bytes. Returns 'jpeg', 'png', 'bmp', 'gif' or None.
+    """
+    if head.startswith(JPEG_MAGIC):
+        return "jpeg"
+    if head.startswith(PNG_MAGIC):
+        return "png"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    return None
+
+
+def _read_exact(f, n):
+    data = f.read(n)
+    if len(data) != n:
+        raise ValueError("Truncated image header.")
+    return data
+
+
+def _jpeg_dimensions(f):
+    _read_exact(f, 2)  # SOI
+    while True:
+        byte = _read_exact(f, 1)
+        if byte != b"\xff":
+            raise ValueError("Malformed JPEG marker.")
+        marker = _read_exact(f, 1)[0]
+        while marker == 0xFF:  # fill bytes
+            marker = _read_exact(f, 1)[0]
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            continue  # standalone markers, no length
+        if marker == 0xD9:
+            raise ValueError("JPEG has no frame header.")
+        (length,) = struct.unpack(">H", _read_exact(f, 2))
+        if length < 2:
+            raise ValueError("Malformed JPEG segment.")
+        if marker in _SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", _read_exact(f, 5))
+            return width, height
+        f.seek(length - 2, io.SEEK_CUR)
+
+
+def read_image_header(f):
+    """
+    Read just enough of an encoded image from file object `f` to return
+    (format, width, height) without decoding pixels. Width and height are
+    None for formats whose header is not parsed. Raises ValueError for
+    unrecognised or malformed data.
+    """
+    head = f.read(32)
+    fmt = sniff_format(head)
+    if fmt is None:
+        raise ValueError("Unrecognised image format.")
+
+    if fmt == "jpeg":
+        f.seek(-len(head), io.SEEK_CUR)
+        width, height = _jpeg_dimensions(f)
+    elif fmt == "png":
+        if head[12:16] != b"IHDR":
+            raise ValueError("Malformed PNG header.")
+        width, height = struct.unpack(">II", head[16:24])
+    elif fmt == "bmp":
+        width, height = struct.unpack("<ii", head[18:26])
+        width, height = abs(width), abs(height)
+    else:
+        width, height = struct.unpack("<HH", head[6:10])
+    return fmt, width, height
+
+
+def image_dimensions(buf):
+    """
+    Same as read_image_header, for an in-memory buffer.
+    """
+    return read_image_header(io.BytesIO(buf))
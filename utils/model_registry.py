@@ -0,0 +1,266 @@
+"""
+Process-wide model registry.
+
+Each (model path, backend) pair is loaded lazily, exactly once, on first
+use and then shared by every caller in the process -- helperslocal, the
+API and scripts all get the same object. Loads are timed, the resident
+memory they add is recorded, and the model is warmed up with a dummy batch
+so the first real request does not pay for graph tracing.
+
+ModelSlot holds the version currently serving the API and can swap in a new
+model file at runtime without a restart. Reloads also go through the
+registry, which then forgets the version they replaced, so its memory is
+freed once the last request using it finishes.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.backends import load_backend
+
+DEFAULT_MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'results', 'models', 'final_model.h5'))
+
+
+def _rss_bytes():
+    """
+    Current resident set size of this process, or None if it cannot be read.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def warm_up(model, batch_sizes=(1,)):
+    """
+    Run dummy batches through `model` so tracing / allocation happens now.
+    Returns the time taken in seconds.
+    """
+    input_shape = tuple(model.input_shape[1:])
+    start = time.perf_counter()
+    for batch_size in batch_sizes:
+        model.predict_on_batch(np.zeros((batch_size,) + input_shape, dtype=np.float32))
+    return time.perf_counter() - start
+
+
+class ModelRegistry:
+    """
+    Loads models on first request and hands out the same instance afterwards.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._key_locks = {}
+
+    @staticmethod
+    def _key(path, backend):
+        return os.path.abspath(path or DEFAULT_MODEL_PATH), backend
+
+    def get(self, path=None, backend=None, warmup_batch_sizes=(1,), force=False):
+        """
+        Return the model at `path` (default: results/models/final_model.h5),
+        loading and warming it up on the first call. force=True loads the file
+        again (it has changed on disk) and replaces the registered model.
+        """
+        key = self._key(path, backend)
+        entry = self._entries.get(key)
+        if entry is not None and not force:
+            return entry["model"]
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Loads of different models can proceed in parallel; the same model loads once
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None and not force:
+                return entry["model"]
+
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model = load_backend(key[0], backend)
+            load_seconds = time.perf_counter() - start
+            warmup_seconds = warm_up(model, warmup_batch_sizes) if warmup_batch_sizes else 0.0
+            rss_after = _rss_bytes()
+
+            entry = {
+                "model": model,
+                "path": key[0],
+                "backend": backend or ("keras" if hasattr(model, "layers") else model.name),
+                "load_seconds": round(load_seconds, 3),
+                "warmup_seconds": round(warmup_seconds, 3),
+                "memory_mb": round((rss_after - rss_before) / 2**20, 1) if rss_before and rss_after else None,
+                "loaded_at": time.time(),
+            }
+            self._entries[key] = entry
+            print(f"Loaded model {key[0]} in {entry['load_seconds']}s "
+                  f"(warm-up {entry['warmup_seconds']}s, +{entry['memory_mb']} MB RSS)")
+            return model
+
+    def drop(self, path=None, backend=None):
+        """
+        Forget the model at `path`; it is freed once no caller holds it any more.
+        """
+        self._entries.pop(self._key(path, backend), None)
+
+    def is_loaded(self, path=None, backend=None):
+        return self._key(path, backend) in self._entries
+
+    def stats(self):
+        """
+        Load statistics for every model loaded so far (without the model objects).
+        """
+        return [{k: v for k, v in entry.items() if k != "model"} for entry in self._entries.values()]
+
+
+registry = ModelRegistry()
+
+
+def get_model(path=None, backend=None, warmup_batch_sizes=(1,)):
+    """
+    Shortcut for the process-wide registry.
+    """
+    return registry.get(path, backend, warmup_batch_sizes)
+
+
+class ModelVersion:
+    """
+    One loaded model generation. Instances are never mutated, so a request
+    that grabbed one keeps using a consistent model even across a swap.
+    """
+
+    def __init__(self, model, version, path, embedding_model=None):
+        self.model = model
+        self.embedding_model = embedding_model
+        self.version = version
+        self.path = path
+        self.loaded_at = time.time()
+
+
+def file_version(path):
+    """
+    Short content hash of a model file, used as its version string.
+    """
+    h = hashlib.blake2b(digest_size=6)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ModelSlot:
+    """
+    Versioned slot holding the model that serves requests.
+
+    reload() loads a (possibly new) model file in a background thread, warms it
+    up and then swaps it in with a single reference assignment; requests keep
+    being served by the previous version until then. An optional watcher thread
+    reloads automatically when the model file changes on disk.
+    """
+
+    def __init__(self, path, backend=None, prepare=None, warmup_batch_sizes=(1,)):
+        self.path = path
+        self.backend = backend
+        # prepare(model) -> embedding model (or None), built for every new version
+        self.prepare = prepare
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.status = {"state": "idle", "error": None, "started_at": None, "finished_at": None}
+        self._current = ModelVersion(None, None, path)
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+
+    def current(self):
+        return self._current
+
+    def _build(self, path, model):
+        embedding_model = self.prepare(model) if self.prepare else None
+        return ModelVersion(model, file_version(path), path, embedding_model)
+
+    def load_initial(self):
+        """
+        Load the slot's first version through the shared registry (so it is the
+        same object utils.helperslocal uses).
+        """
+        model = registry.get(self.path, self.backend, self.warmup_batch_sizes)
+        self._current = self._build(self.path, model)
+        return self._current
+
+    def reload(self, path=None, background=True):
+        """
+        Load `path` (default: the slot's path) and swap it in once warmed up.
+        Returns False if a reload is already running.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self.status = {"state": "loading", "error": None, "started_at": time.time(), "finished_at": None}
+
+        def run():
+            try:
+                new_path = path or self.path
+                model = registry.get(new_path, self.backend, self.warmup_batch_sizes, force=True)
+                new_version = self._build(new_path, model)
+                old_path = self._current.path
+                self._current = new_version
+                self.path = new_version.path
+                if os.path.abspath(old_path) != os.path.abspath(new_version.path):
+                    registry.drop(old_path, self.backend)
+                self.status = dict(self.status, state="idle", finished_at=time.time())
+                print(f"Model reloaded: version {new_version.version} from {new_version.path}")
+            except Exception as e:
+                self.status = dict(self.status, state="failed", error=str(e), finished_at=time.time())
+                print(f"Model reload failed, still serving version {self._current.version}: {e}")
+            finally:
+                self._reload_lock.release()
+
+        if background:
+            threading.Thread(target=run, name="model-reload", daemon=True).start()
+        else:
+            run()
+        return True
+
+    def watch(self, interval=5.0):
+        """
+        Poll the model file every `interval` seconds and reload after it has
+        changed and then stayed unchanged for one interval (so half-copied
+        files are not loaded).
+        """
+        # Like the batcher, a watcher started before fork() does not run in the child
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            return
+
+        def stat(path):
+            try:
+                st = os.stat(path)
+                return st.st_mtime_ns, st.st_size
+            except OSError:
+                return None
+
+        def run():
+            last_seen = stat(self.path)
+            pending = None
+            while True:
+                time.sleep(interval)
+                seen = stat(self.path)
+                if seen is None or seen == last_seen:
+                    pending = None
+                    continue
+                if pending == seen:
+                    # Busy with another reload: keep the change pending and retry next tick
+                    if self.reload(background=False):
+                        last_seen, pending = seen, None
+                else:
+                    pending = seen
+
+        self._watcher_pid = os.getpid()
+        self._watcher = threading.Thread(target=run, name="model-watcher", daemon=True)
+        self._watcher.start()
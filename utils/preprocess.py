@@ -0,0 +1,169 @@
+"""
+Image decoding and preprocessing shared by training, evaluation, the
+preprocessing CLI and the API. Only depends on OpenCV and NumPy so it can be
+imported cheaply by worker processes.
+
+Every consumer goes through the same steps -- grayscale decode, resize to
+IMG_SIZE, optional CLAHE, scale to float32 [0, 1] -- so a model sees identical
+inputs at training and inference time.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+from utils.imageheader import image_dimensions, read_image_header
+
+IMG_SIZE = (128, 128)
+# The deployed model was trained on processed_dataset, which was built without
+# CLAHE; only switch this on together with a retrained model.
+APPLY_CLAHE = False
+CLAHE_CLIP_LIMIT = 2.0
+CLAHE_TILE_GRID = (8, 8)
+
+_local = threading.local()
+
+
+def get_clahe():
+    """
+    CLAHE operator, built once per thread (and so once per worker process)
+    instead of once per image.
+    """
+    clahe = getattr(_local, "clahe", None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+    return clahe
+
+
+# DCT-domain reduced JPEG decodes, largest reduction first
+_REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+def reduced_decode_flag(src_size, img_size=IMG_SIZE):
+    """
+    Pick the cheapest grayscale decode flag for a JPEG of `src_size` (width, height)
+    that still leaves at least `img_size` pixels on both sides, so the final
+    cv2.resize only ever shrinks. Width/height are compared orientation-free
+    because imread applies EXIF rotation after decoding.
+    """
+    for factor, flag in _REDUCED_GRAYSCALE_FLAGS:
+        if min(src_size) // factor >= max(img_size):
+            return flag
+    return cv2.IMREAD_GRAYSCALE
+
+
+def file_decode_flag(file_path, img_size=IMG_SIZE):
+    """
+    Decode flag for an image file: a reduced flag for large JPEGs, else IMREAD_GRAYSCALE.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            fmt, width, height = read_image_header(f)
+    except (OSError, ValueError):
+        return cv2.IMREAD_GRAYSCALE
+    if fmt != "jpeg":
+        return cv2.IMREAD_GRAYSCALE
+    return reduced_decode_flag((width, height), img_size)
+
+
+def bytes_decode_flag(buf, img_size=IMG_SIZE):
+    """
+    Same as file_decode_flag, for an encoded image held in memory.
+    """
+    try:
+        fmt, width, height = image_dimensions(buf)
+    except ValueError:
+        return cv2.IMREAD_GRAYSCALE
+    if fmt != "jpeg":
+        return cv2.IMREAD_GRAYSCALE
+    return reduced_decode_flag((width, height), img_size)
+
+
+def resize_and_enhance(img, img_size=IMG_SIZE, apply_clahe=APPLY_CLAHE, out=None):
+    """
+    Resize a uint8 grayscale image to `img_size` and optionally apply CLAHE,
+    writing into `out` (a preallocated (H, W) uint8 array) when given.
+    """
+    if img.shape[:2] == (img_size[1], img_size[0]) and not apply_clahe:
+        if out is None:
+            return img
+        out[...] = img
+        return out
+    resized = cv2.resize(img, img_size, dst=None if apply_clahe else out)
+    if apply_clahe:
+        resized = get_clahe().apply(resized, dst=out)
+    return resized
+
+
+def imread_grayscale(file_path, img_size=IMG_SIZE, reduced_decode=True):
+    """
+    Decode an image file as uint8 grayscale, not yet resized: `img_size` only
+    picks the (reduced) JPEG decode scale. Returns None if it cannot be decoded.
+    """
+    flag = file_decode_flag(file_path, img_size) if reduced_decode else cv2.IMREAD_GRAYSCALE
+    return cv2.imread(file_path, flag)
+
+
+def imdecode_grayscale(buf, img_size=IMG_SIZE, reduced_decode=True):
+    """
+    Same as imread_grayscale, for an encoded image held in memory.
+    """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if not data.size:
+        return None
+    flag = bytes_decode_flag(buf, img_size) if reduced_decode else cv2.IMREAD_GRAYSCALE
+    return cv2.imdecode(data, flag)
+
+
+def read_grayscale(file_path, img_size=IMG_SIZE, reduced_decode=True, apply_clahe=APPLY_CLAHE):
+    """
+    Read an image from disk as a uint8 grayscale array resized to `img_size`.
+    Returns None if the file cannot be decoded.
+    """
+    img = imread_grayscale(file_path, img_size, reduced_decode)
+    if img is None:
+        return None
+    return resize_and_enhance(img, img_size, apply_clahe)
+
+
+def decode_grayscale_bytes(buf, img_size=IMG_SIZE, reduced_decode=True, apply_clahe=APPLY_CLAHE):
+    """
+    Decode an encoded image held in memory as a uint8 grayscale array resized
+    to `img_size`. Returns None if the data cannot be decoded.
+    """
+    img = imdecode_grayscale(buf, img_size, reduced_decode)
+    if img is None:
+        return None
+    return resize_and_enhance(img, img_size, apply_clahe)
+
+
+def to_float_batch(images, out=None):
+    """
+    Scale a (N, H, W) uint8 stack to a contiguous (N, H, W, 1) float32 array in [0, 1]
+    with a single vectorised multiply, writing into `out` when given.
+    """
+    images = np.asarray(images, dtype=np.uint8)
+    if out is None:
+        out = np.empty(images.shape + (1,), dtype=np.float32)
+    np.multiply(images, np.float32(1.0 / 255.0), out=out[..., 0], casting="unsafe")
+    return out
+
+
+def preprocess_batch(images, img_size=IMG_SIZE, apply_clahe=APPLY_CLAHE, out=None):
+    """
+    Preprocess a stack of N uint8 grayscale images (a list of any sizes, e.g.
+    from imread_grayscale / imdecode_grayscale, or an (N, H, W) array) into a
+    contiguous (N, H, W, 1) float32 array.
+
+    Resizing and CLAHE write into one preallocated uint8 staging buffer and the
+    float conversion is done for the whole batch at once, so the only per-call
+    allocations are the staging buffer and (unless `out` is given) the result.
+    """
+    staging = np.empty((len(images), img_size[1], img_size[0]), dtype=np.uint8)
+    for i, img in enumerate(images):
+        resize_and_enhance(img, img_size, apply_clahe, out=staging[i])
+    return to_float_batch(staging, out=out)
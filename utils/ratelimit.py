@@ -0,0 +1,197 @@
+"""
+Lockout state for failed authentication attempts.
+
+A store counts failures per claimed identity and locks the identity out for
+`lockout_seconds` once `threshold` failures have piled up. Failure counts
+are forgotten `ttl_seconds` after the last failure, and at most `max_entries`
+identities are tracked, so junk identities cannot grow the state without
+bound. Eviction only ever drops identities that are not locked out: flooding
+the store with junk identities must not lift a lockout. Identities locked out
+at the same time can briefly push the store past `max_entries`.
+
+    MemoryLockoutStore  per-process; OrderedDict kept in last-failure order,
+                        so lookups, updates, expiry and eviction are all O(1)
+    SQLiteLockoutStore  one SQLite file shared by every worker process
+                        (WAL mode, updates in IMMEDIATE transactions)
+
+make_lockout_store("memory") or make_lockout_store("sqlite:///path/to/lockouts.db")
+picks one.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryLockoutStore:
+    """
+    In-process lockout store. Entries are kept ordered by their last failure,
+    so the oldest entry is always first: expired entries are swept from the
+    front, and when the store is full the least recently failing identity that
+    is not locked out is evicted.
+    """
+
+    def __init__(self, threshold=5, lockout_seconds=60, ttl_seconds=900, max_entries=100000):
+        self.threshold = threshold
+        self.lockout_seconds = lockout_seconds
+        self.ttl_seconds = max(ttl_seconds, lockout_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (failure count, time of last failure)
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._entries:
+            key, (_, last_failed) = next(iter(self._entries.items()))
+            if now - last_failed < self.ttl_seconds:
+                break
+            del self._entries[key]
+
+    def locked_for(self, key):
+        """
+        Seconds until `key` may try again, or 0 if it is not locked out.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            count, last_failed = self._entries.get(key, (0, None))
+        if count >= self.threshold:
+            return max(0, int(self.lockout_seconds - (now - last_failed)))
+        return 0
+
+    def record_failure(self, key):
+        """
+        Count one failed attempt for `key`; returns the failure count.
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            count = self._entries.pop(key, (0, None))[0] + 1
+            self._entries[key] = (count, now)
+            if len(self._entries) > self.max_entries:
+                self._evict(now)
+        return count
+
+    def _evict(self, now):
+        # Oldest first, skipping locked-out identities (which sit near the back anyway)
+        excess = len(self._entries) - self.max_entries
+        victims = []
+        for key, (count, last_failed) in self._entries.items():
+            if len(victims) == excess:
+                break
+            if count < self.threshold or now - last_failed >= self.lockout_seconds:
+                victims.append(key)
+        for key in victims:
+            del self._entries[key]
+
+    def reset(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteLockoutStore:
+    """
+    Lockout store in a SQLite file, shared by all processes that open it.
+    Each process (and thread) gets its own connection; increments run inside
+    BEGIN IMMEDIATE transactions, so concurrent workers never lose a failure.
+    Expired rows and rows above `max_entries` are purged every
+    `purge_every` writes. Stores for different purposes can share one file
+    under different `table` names.
+    """
+
+    def __init__(self, path, threshold=5, lockout_seconds=60, ttl_seconds=900, max_entries=100000,
+                 purge_every=1000, table="lockouts"):
+        self.path = path
+        self.table = table
+        self.threshold = threshold
+        self.lockout_seconds = lockout_seconds
+        self.ttl_seconds = max(ttl_seconds, lockout_seconds)
+        self.max_entries = max_entries
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table} "
+                         "(key TEXT PRIMARY KEY, count INTEGER NOT NULL, last_failed REAL NOT NULL)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_failed ON {self.table} (last_failed)")
+
+    def _connect(self):
+        # Connections must not cross fork() or threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def locked_for(self, key):
+        """
+        Seconds until `key` may try again, or 0 if it is not locked out.
+        """
+        now = time.time()
+        row = self._connect().execute(f"SELECT count, last_failed FROM {self.table} "
+                                      "WHERE key = ? AND last_failed > ?", (key, now - self.ttl_seconds)).fetchone()
+        if row and row[0] >= self.threshold:
+            return max(0, int(self.lockout_seconds - (now - row[1])))
+        return 0
+
+    def record_failure(self, key):
+        """
+        Count one failed attempt for `key`; returns the failure count.
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # An expired row starts counting again from 1
+            conn.execute(f"INSERT INTO {self.table} (key, count, last_failed) VALUES (?, 1, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET "
+                         "count = CASE WHEN last_failed > ? THEN count + 1 ELSE 1 END, last_failed = excluded.last_failed",
+                         (key, now, now - self.ttl_seconds))
+            count = conn.execute(f"SELECT count FROM {self.table} WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge(now)
+        return count
+
+    def reset(self, key):
+        self._connect().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge(self, now=None):
+        """
+        Drop expired rows, then the oldest rows beyond `max_entries` that are not locked out.
+        """
+        now = now or time.time()
+        conn = self._connect()
+        conn.execute(f"DELETE FROM {self.table} WHERE last_failed <= ?", (now - self.ttl_seconds,))
+        unlocked = f"NOT (count >= {int(self.threshold)} AND last_failed > ?)"
+        locked = conn.execute(f"SELECT COUNT(*) FROM {self.table} WHERE NOT {unlocked}",
+                              (now - self.lockout_seconds,)).fetchone()[0]
+        conn.execute(f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} WHERE {unlocked} "
+                     "ORDER BY last_failed DESC LIMIT -1 OFFSET ?)",
+                     (now - self.lockout_seconds, max(0, self.max_entries - locked)))
+
+    def __len__(self):
+        return self._connect().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def make_lockout_store(url="memory", **kwargs):
+    """
+    Build a lockout store from "memory" or "sqlite:///path/to/file.db".
+    `table` only applies to SQLite.
+    """
+    table = kwargs.pop("table", "lockouts")
+    if url == "memory":
+        return MemoryLockoutStore(**kwargs)
+    if url.startswith("sqlite:///"):
+        return SQLiteLockoutStore(url[len("sqlite:///"):], table=table, **kwargs)
+    raise ValueError(f"Unsupported lockout store: {url}")
@@ -0,0 +1,74 @@
+"""
+LRU + TTL cache for model outputs, keyed by the content of the uploaded image.
+
+Retried uploads and replayed monitoring images are byte-identical, so a
+BLAKE2b digest of the raw bytes identifies them without decoding anything.
+Keys also carry the model version (and which head produced the output), so
+a hot-reloaded model never serves results computed by its predecessor.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(data):
+    """
+    128-bit BLAKE2b digest of raw bytes.
+    """
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL. max_entries=0 disables it.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expiry time, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the cached value for `key`, or None on a miss or expired entry.
+        """
+        if not self.max_entries:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
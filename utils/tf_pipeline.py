@@ -0,0 +1,192 @@
+"""
+Streaming tf.data input pipeline for training.
+
+Unlike create_data_generators / create_tf_data_pipeline in helperslocal,
+nothing here materialises the dataset as one NumPy array: the train/val/test
+split is made over file paths and labels, and images are read, decoded and
+resized inside tf.data with parallel map calls -- through read_grayscale in
+utils/preprocess.py, the same OpenCV decode and resize the API serves with --
+and training batches are
+augmented with batched tensor ops. Decoded images are cached as
+uint8 to a file per split (so epochs after the first skip JPEG decoding) and
+batches are prefetched. Peak memory is bounded by the shuffle buffer and
+prefetch depth, not by the dataset size.
+
+    train_ds, val_ds, test_ds, class_names = create_streaming_pipeline("processed_dataset")
+"""
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+from sklearn.model_selection import train_test_split
+
+from utils.augment import apply_augmentation
+from utils.datapack import list_sources
+from utils.preprocess import APPLY_CLAHE, read_grayscale
+
+# Bump when decode_and_resize changes, so caches of the old pixels are not reused
+CACHE_VERSION = 2
+
+
+def split_indices(y, seed=42):
+    """
+    Stratified 70/15/15 train/val/test split of sample indices. The split
+    depends on the order and labels of `y`, so it is only reproducible for the
+    same file list; model.train saves the split it used (see save_split) for
+    evaluation and export to reuse.
+    """
+    idx = np.arange(len(y))
+    idx_train, idx_temp = train_test_split(idx, stratify=y, test_size=0.3, random_state=seed)
+    idx_val, idx_test = train_test_split(idx_temp, stratify=y[idx_temp], test_size=0.5, random_state=seed)
+    return idx_train, idx_val, idx_test
+
+
+def split_sources(data_dir, seed=42):
+    """
+    Stratified train/val/test split of the files in `data_dir`. Returns
+    (class_names, {"train": [(relative path, label), ...], "val": ..., "test": ...}).
+    """
+    class_names, sources = list_sources(data_dir)
+    labels = np.array([label for _, label in sources], dtype=np.int32)
+    splits = {split: [sources[i] for i in idx]
+              for split, idx in zip(("train", "val", "test"), split_indices(labels, seed))}
+    return class_names, splits
+
+
+def split_path_for(model_path):
+    """
+    Where the split a model was trained on is kept: <model>_split.json next to it.
+    """
+    return os.path.splitext(model_path)[0] + "_split.json"
+
+
+def save_split(path, class_names, splits):
+    with open(path + ".tmp", "w") as f:
+        json.dump({"class_names": class_names,
+                   **{split: [[rel_path, int(label)] for rel_path, label in entries]
+                      for split, entries in splits.items()}}, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_split(path):
+    """
+    (class_names, splits) as written by save_split.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    class_names = data.pop("class_names")
+    return class_names, {split: [(rel_path, label) for rel_path, label in entries] for split, entries in data.items()}
+
+
+def default_cache_dir(data_dir):
+    return os.path.normpath(data_dir) + "_tfcache"
+
+
+def _cache_file(cache_dir, split, paths, img_size):
+    # The cache is only valid for these exact files and settings, so all of them go
+    # into its name. Size and mtime stand in for the content: re-running the
+    # preprocessing (another --size, --clahe) rewrites files under the same names.
+    h = hashlib.blake2b(digest_size=8)
+    h.update(repr((CACHE_VERSION, tuple(img_size), APPLY_CLAHE)).encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0".encode())
+    return os.path.join(cache_dir, f"{split}-{h.hexdigest()}")
+
+
+def clear_stale_cache(cache_file):
+    """
+    Remove every other cache of the same split from the cache directory, and
+    whatever an interrupted first pass over `cache_file` left behind. A
+    finished tf.data cache is <cache_file>.index plus its .data shards; while it
+    is being written TF keeps a <cache_file>_0.lockfile and temporary shards,
+    and a leftover lockfile makes every later run fail with AlreadyExistsError.
+    Only one run may use a cache directory at a time.
+    """
+    cache_dir, name = os.path.split(cache_file)
+    split = name.rsplit("-", 1)[0]
+    keep = (name + ".index", name + ".data-")
+    for path in glob.glob(os.path.join(glob.escape(cache_dir), glob.escape(split) + "-*")):
+        if not os.path.basename(path).startswith(keep):
+            os.remove(path)
+
+
+def _read_grayscale(path, img_size):
+    img = read_grayscale(path.decode(), img_size)
+    if img is None:
+        raise ValueError(f"Could not decode {path.decode()}")
+    return img[..., np.newaxis]
+
+
+def decode_and_resize(path, img_size=(128, 128)):
+    """
+    Read and decode one image file as a (H, W, 1) uint8 tensor with
+    read_grayscale, so training sees the pixels the API will serve (reduced
+    JPEG decode and cv2.resize rather than tf.image's decode and resize).
+    """
+    img = tf.numpy_function(lambda p: _read_grayscale(p, img_size), [path], tf.uint8, stateful=False)
+    img.set_shape((img_size[1], img_size[0], 1))
+    return img
+
+
+def make_dataset(paths, labels, num_classes, img_size=(128, 128), batch_size=32, training=False, augment=True,
+                 cache_file=None, shuffle_buffer=1024, seed=42, augment_parallel_calls=tf.data.AUTOTUNE):
+    """
+    Dataset of (images (B, H, W, 1) float32 in [0, 1], one-hot labels) batches
+    streamed from `paths`. Training batches are augmented whole (see
+    utils/augment.py), `augment_parallel_calls` batches at a time.
+    """
+    paths = np.asarray(paths)
+    labels = np.asarray(labels, dtype=np.int32)
+    if training:
+        # Shuffle the file order once so the cache (and the shuffle buffer) is not class-sorted
+        order = np.random.default_rng(seed).permutation(len(paths))
+        paths, labels = paths[order], labels[order]
+
+    ds = tf.data.Dataset.from_tensor_slices((paths, labels))
+    ds = ds.map(lambda path, label: (decode_and_resize(path, img_size), label),
+                num_parallel_calls=tf.data.AUTOTUNE, deterministic=not training)
+    if cache_file is not None:
+        ds = ds.cache(cache_file)
+    if training:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.map(lambda image, label: (tf.cast(image, tf.float32) / 255.0, tf.one_hot(label, num_classes)),
+                num_parallel_calls=tf.data.AUTOTUNE)
+    ds = ds.batch(batch_size)
+    if training and augment:
+        ds = apply_augmentation(ds, num_parallel_calls=augment_parallel_calls)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def create_streaming_pipeline(data_dir, img_size=(128, 128), batch_size=32, augment=True, cache_dir=None,
+                              shuffle_buffer=1024, seed=42, augment_parallel_calls=tf.data.AUTOTUNE, split=None):
+    """
+    Build train/val/test datasets streamed from the class folders in `data_dir`.
+    Decoded images are cached under `cache_dir` (default: <data_dir>_tfcache);
+    pass cache_dir=False to disable caching. Give concurrent runs separate
+    cache directories. `split` is a (class_names, splits) pair, e.g. from
+    load_split, to use instead of splitting the current files afresh.
+    Returns (train_ds, val_ds, test_ds, class_names).
+    """
+    class_names, splits = split or split_sources(data_dir, seed)
+    if cache_dir is None:
+        cache_dir = default_cache_dir(data_dir)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    datasets = []
+    for split, entries in splits.items():
+        paths = np.array([os.path.join(data_dir, rel_path) for rel_path, _ in entries])
+        labels = np.array([label for _, label in entries], dtype=np.int32)
+        cache_file = None
+        if cache_dir:
+            cache_file = _cache_file(cache_dir, split, paths, img_size)
+            clear_stale_cache(cache_file)
+        datasets.append(make_dataset(paths, labels, len(class_names), img_size, batch_size,
+                                     training=split == "train", augment=augment, cache_file=cache_file,
+                                     shuffle_buffer=shuffle_buffer, seed=seed,
+                                     augment_parallel_calls=augment_parallel_calls))
+    return (*datasets, class_names)
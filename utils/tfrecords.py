@@ -0,0 +1,205 @@
+"""
+Sharded TFRecord export of the processed palm dataset, and a matching reader.
+
+`export_tfrecords` decodes every image once (same preprocessing as
+load_processed_images) and writes shuffled shards
+
+    palms-00000-of-00008.tfrecord ... plus manifest.json
+
+Each record holds the raw uint8 pixels, the class label and the metadata in
+the file name, e.g. 027_S_L_26.jpg -> subject 027, session S, hand L, index 26.
+
+`tfrecord_dataset` streams the shards back with parallel interleaved reads
+(large sequential I/O instead of one small file open per image) and can split
+them across training workers with `num_workers` / `worker_index`.
+`load_tfrecord_images` returns the same (X, y, class_names) as
+load_processed_images.
+
+Usage:
+    python -m utils.tfrecords processed_dataset --out-dir processed_dataset_tfrecords --shards 8
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+from utils.datapack import list_sources
+from utils.preprocess import read_grayscale, to_float_batch
+
+SHARD_PATTERN = "palms-*.tfrecord"
+# <subject>_<session>_<hand>_<index>.<ext>, e.g. 027_S_L_26.jpg
+_NAME_RE = re.compile(r"^(?P<subject>\d+)_(?P<session>[A-Za-z0-9]+)_(?P<hand>[LRlr])_(?P<index>\d+)\.\w+$")
+
+
+def default_tfrecord_dir(data_dir):
+    return os.path.normpath(data_dir) + "_tfrecords"
+
+
+def parse_palm_name(filename):
+    """
+    Metadata encoded in a palm image file name. Fields that cannot be parsed
+    are returned as "" (or -1 for the index).
+    """
+    match = _NAME_RE.match(os.path.basename(filename))
+    if match is None:
+        return {"subject": "", "session": "", "hand": "", "index": -1}
+    return {"subject": match["subject"], "session": match["session"], "hand": match["hand"].upper(),
+            "index": int(match["index"])}
+
+
+def _bytes(value):
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
+
+
+def _int(value):
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
+
+
+def serialize_example(image, label, rel_path):
+    meta = parse_palm_name(rel_path)
+    if not meta["subject"] and "/" in rel_path:
+        meta["subject"] = rel_path.split("/", 1)[0]  # unparsed name: fall back to the class folder
+    features = {
+        "image": _bytes(image.tobytes()),
+        "height": _int(image.shape[0]),
+        "width": _int(image.shape[1]),
+        "label": _int(label),
+        "subject": _bytes(meta["subject"].encode()),
+        "session": _bytes(meta["session"].encode()),
+        "hand": _bytes(meta["hand"].encode()),
+        "index": _int(meta["index"]),
+        "path": _bytes(rel_path.encode()),
+    }
+    return tf.train.Example(features=tf.train.Features(feature=features)).SerializeToString()
+
+
+def export_tfrecords(data_dir, out_dir=None, img_size=(128, 128), num_shards=8, seed=42, workers=None):
+    """
+    Write `data_dir` as `num_shards` TFRecord files. Images are assigned to
+    shards in a seeded random order so every shard mixes all classes.
+    Returns the manifest.
+    """
+    out_dir = out_dir or default_tfrecord_dir(data_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    for old_shard in glob.glob(os.path.join(out_dir, SHARD_PATTERN)):
+        os.remove(old_shard)
+
+    class_names, sources = list_sources(data_dir)
+    order = np.random.default_rng(seed).permutation(len(sources))
+    sources = [sources[i] for i in order]
+    num_shards = max(1, min(num_shards, len(sources)))
+
+    counts = []
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        for shard in range(num_shards):
+            shard_sources = sources[shard::num_shards]
+            images = pool.map(lambda src: read_grayscale(os.path.join(data_dir, src[0]), img_size), shard_sources)
+            path = os.path.join(out_dir, f"palms-{shard:05d}-of-{num_shards:05d}.tfrecord")
+            count = 0
+            with tf.io.TFRecordWriter(path) as writer:
+                for (rel_path, label), image in zip(shard_sources, images):
+                    if image is None:
+                        continue  # undecodable file, same as load_processed_images
+                    writer.write(serialize_example(image, label, rel_path.replace(os.sep, "/")))
+                    count += 1
+            counts.append(count)
+
+    manifest = {"img_size": list(img_size), "class_names": class_names, "num_records": sum(counts),
+                "shards": counts}
+    with open(os.path.join(out_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def read_manifest(tfrecord_dir):
+    with open(os.path.join(tfrecord_dir, "manifest.json")) as f:
+        return json.load(f)
+
+
+_FEATURES = {
+    "image": tf.io.FixedLenFeature([], tf.string),
+    "height": tf.io.FixedLenFeature([], tf.int64),
+    "width": tf.io.FixedLenFeature([], tf.int64),
+    "label": tf.io.FixedLenFeature([], tf.int64),
+    "subject": tf.io.FixedLenFeature([], tf.string),
+    "session": tf.io.FixedLenFeature([], tf.string),
+    "hand": tf.io.FixedLenFeature([], tf.string),
+    "index": tf.io.FixedLenFeature([], tf.int64),
+    "path": tf.io.FixedLenFeature([], tf.string),
+}
+
+
+def tfrecord_dataset(tfrecord_dir, batch_size=None, shuffle=False, shuffle_buffer=1024, num_workers=1,
+                     worker_index=0, cycle_length=4, with_metadata=False, normalize=True, seed=42):
+    """
+    Stream (image, label) pairs -- or (image, label, metadata dict) with
+    with_metadata=True -- from the shards in `tfrecord_dir`. Images are
+    (H, W, 1) float32 in [0, 1] (uint8 with normalize=False). Shards are
+    split round-robin across `num_workers` and read `cycle_length` at a time
+    in parallel.
+    """
+    files = tf.data.Dataset.list_files(os.path.join(tfrecord_dir, SHARD_PATTERN), shuffle=shuffle, seed=seed)
+    if num_workers > 1:
+        files = files.shard(num_workers, worker_index)
+    ds = files.interleave(tf.data.TFRecordDataset, cycle_length=cycle_length,
+                          num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+
+    def parse(record):
+        ex = tf.io.parse_single_example(record, _FEATURES)
+        image = tf.reshape(tf.io.decode_raw(ex["image"], tf.uint8), tf.stack([ex["height"], ex["width"], 1]))
+        if normalize:
+            image = tf.cast(image, tf.float32) / 255.0
+        label = tf.cast(ex["label"], tf.int32)
+        if with_metadata:
+            meta = {key: ex[key] for key in ("subject", "session", "hand", "index", "path")}
+            return image, label, meta
+        return image, label
+
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.map(parse, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    if batch_size:
+        ds = ds.batch(batch_size)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def load_tfrecord_images(tfrecord_dir, batch_size=1024):
+    """
+    Drop-in for load_processed_images: all records as (X float32 (N, H, W, 1), y, class_names),
+    in shard order.
+    """
+    manifest = read_manifest(tfrecord_dir)
+    X, y = [], []
+    for images, labels in tfrecord_dataset(tfrecord_dir, batch_size=batch_size, normalize=False):
+        X.append(images.numpy()[..., 0])
+        y.append(labels.numpy())
+    height, width = manifest["img_size"][1], manifest["img_size"][0]
+    X = to_float_batch(np.concatenate(X) if X else np.zeros((0, height, width), np.uint8))
+    return X, np.concatenate(y) if y else np.zeros(0, np.int32), manifest["class_names"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a processed palm dataset to sharded TFRecord files.")
+    parser.add_argument("data_dir", help="Class-per-folder dataset, e.g. processed_dataset")
+    parser.add_argument("--out-dir", help="Output folder (default: <data_dir>_tfrecords)")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--img-size", type=int, default=128)
+    parser.add_argument("--workers", type=int, default=None, help="Decoding threads (default: all cores)")
+    args = parser.parse_args()
+
+    start = time.time()
+    out_dir = args.out_dir or default_tfrecord_dir(args.data_dir)
+    manifest = export_tfrecords(args.data_dir, out_dir, (args.img_size, args.img_size), args.shards,
+                                workers=args.workers)
+    print(f"✅ Wrote {manifest['num_records']} records in {len(manifest['shards'])} shards to '{out_dir}' "
+          f"in {time.time() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
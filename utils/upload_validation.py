@@ -0,0 +1,127 @@
+"""
+Validate uploaded images from their first bytes, before the body is read
+into memory or handed to the decoder.
+
+validate_upload() reads a small head of the upload stream, checks the magic
+bytes against the allowed formats and parses the header for the image size.
+Wrong formats, absurd dimensions and decompression bombs (tiny files that
+declare a huge pixel count) are rejected at that point; only then is the rest
+of the body read, and never more than `max_bytes`.
+
+UploadSpool applies the format and size checks one step earlier, while the
+multipart body is being received: used as the form parser's stream factory,
+each file part fails as soon as its first bytes arrive with the wrong magic,
+or once it grows past `max_bytes`, instead of after the whole request has
+been spooled.
+"""
+import io
+import tempfile
+
+from utils.imageheader import read_image_header, sniff_format
+
+ALLOWED_FORMATS = ("jpeg", "png", "bmp", "gif")
+HEAD_BYTES = 4096
+# Enough for every magic number sniff_format knows (PNG's is the longest)
+SNIFF_BYTES = 8
+# JPEG frame headers can sit behind large EXIF/ICC segments; give up after this much
+MAX_HEAD_BYTES = 256 * 1024
+MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+MAX_IMAGE_SIDE = 10000
+MAX_IMAGE_PIXELS = 40_000_000
+
+
+class UploadRejected(Exception):
+    """
+    Raised for an unacceptable upload; `status` is the HTTP status to answer with.
+    Not a ValueError: the form parsers treat those as a malformed body and
+    silently drop the form, which would hide a rejection from UploadSpool.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadSpool:
+    """
+    Writable, readable spool for one multipart file part. write() raises
+    UploadRejected once the first SNIFF_BYTES are not an allowed image format,
+    or once more than `max_bytes` have been written.
+    """
+
+    def __init__(self, max_bytes=MAX_UPLOAD_BYTES, allowed_formats=ALLOWED_FORMATS, max_memory=512 * 1024):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self.max_bytes = max_bytes
+        self.allowed_formats = allowed_formats
+        self._head = b""
+        self._size = 0
+
+    def write(self, data):
+        self._size += len(data)
+        if self._size > self.max_bytes:
+            raise UploadRejected(f"File is larger than {self.max_bytes // 1024} KB.", 413)
+        if len(self._head) < SNIFF_BYTES:
+            self._head += bytes(data[:SNIFF_BYTES - len(self._head)])
+            if len(self._head) == SNIFF_BYTES and sniff_format(self._head) not in self.allowed_formats:
+                raise UploadRejected("Unsupported image format.", 415)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+def upload_stream_factory(max_bytes=MAX_UPLOAD_BYTES, allowed_formats=ALLOWED_FORMATS):
+    """
+    A werkzeug/Quart form parser `stream_factory` that spools every file part
+    into an UploadSpool.
+    """
+    def factory(total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(max_bytes, allowed_formats)
+    return factory
+
+
+def _read_header(head):
+    try:
+        return read_image_header(io.BytesIO(head))
+    except (ValueError, EOFError):
+        return None
+
+
+def validate_upload(stream, max_bytes=MAX_UPLOAD_BYTES, max_side=MAX_IMAGE_SIDE, max_pixels=MAX_IMAGE_PIXELS,
+                    allowed_formats=ALLOWED_FORMATS):
+    """
+    Read an image upload from file object `stream` and return
+    (data, format, width, height). Raises UploadRejected before reading the
+    whole body if the format, size or declared dimensions are unacceptable.
+    """
+    head = stream.read(HEAD_BYTES)
+    if not head:
+        raise UploadRejected("Empty file.")
+    fmt = sniff_format(head)
+    if fmt is None or fmt not in allowed_formats:
+        raise UploadRejected("Unsupported image format.", 415)
+
+    header = _read_header(head)
+    while header is None and len(head) < MAX_HEAD_BYTES:
+        more = stream.read(len(head))
+        if not more:
+            break
+        head += more
+        header = _read_header(head)
+    if header is None:
+        raise UploadRejected("Could not read the image header.")
+
+    _, width, height = header
+    if width is not None:
+        if width <= 0 or height <= 0:
+            raise UploadRejected("Image has no pixels.")
+        if width > max_side or height > max_side or width * height > max_pixels:
+            raise UploadRejected(f"Image dimensions {width}x{height} are too large.", 413)
+
+    rest = stream.read(max_bytes - len(head) + 1) if len(head) <= max_bytes else b""
+    if len(head) + len(rest) > max_bytes:
+        raise UploadRejected(f"File is larger than {max_bytes // 1024} KB.", 413)
+    return head + rest, fmt, width, height
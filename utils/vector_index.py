@@ -0,0 +1,145 @@
+"""
+Vector indexes for 1:N identification over enrolled palm templates.
+
+Both indexes work on L2-normalised float32 vectors, so the inner product is
+the cosine similarity:
+
+- ExactIndex scores every template with one matrix multiply. Best for small
+  and medium galleries (50k 128-d templates score in a few ms on one core).
+- IVFIndex clusters the templates with spherical k-means and, per query, only
+  scores the lists whose centroids are closest. Lists are visited best-first
+  until `n_probe` lists or the latency budget is used up.
+"""
+import time
+
+import numpy as np
+
+from utils.embeddings import l2_normalize
+
+# Galleries up to this size use exact search in build_index
+EXACT_MAX_SIZE = 50000
+
+
+def _top_k(scores, k):
+    """
+    Indices of the k largest scores (sorted, best first) without a full sort.
+    """
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _cluster_sums(vectors, assign, n_clusters):
+    order = np.argsort(assign, kind="stable")
+    counts = np.bincount(assign, minlength=n_clusters)
+    sums = np.zeros((n_clusters, vectors.shape[1]), dtype=np.float32)
+    nonempty = counts > 0
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+    sums[nonempty] = np.add.reduceat(vectors[order], starts, axis=0)
+    return sums
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search with a single (N, D) @ (D,) multiply per query.
+    """
+
+    kind = "exact"
+
+    def __init__(self, ids, vectors):
+        self.ids = list(ids)
+        vectors = l2_normalize(vectors)
+        self.vectors = np.ascontiguousarray(vectors.reshape(len(self.ids), vectors.shape[-1]))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=5, budget_ms=None):
+        """
+        Return [(id, score), ...] for the k most similar templates, best first.
+        """
+        if not self.ids:
+            return []
+        scores = self.vectors @ l2_normalize(query)
+        return [(self.ids[i], float(scores[i])) for i in _top_k(scores, k)]
+
+
+class IVFIndex:
+    """
+    Inverted-file index: spherical k-means partitions the gallery into `n_lists`
+    clusters, each stored as its own contiguous matrix.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, ids, vectors, n_lists=None, n_probe=8, n_iter=10, seed=42):
+        ids = list(ids)
+        vectors = l2_normalize(vectors)
+        vectors = vectors.reshape(len(ids), vectors.shape[-1])
+        n_lists = n_lists or max(1, int(np.sqrt(len(ids))))
+        n_lists = min(n_lists, len(ids)) if ids else 1
+        self.n_probe = n_probe
+
+        rng = np.random.default_rng(seed)
+        if ids:
+            centroids = vectors[rng.choice(len(ids), n_lists, replace=False)]
+            for _ in range(n_iter):
+                assign = np.argmax(vectors @ centroids.T, axis=1)
+                sums = _cluster_sums(vectors, assign, n_lists)
+                empty = ~sums.any(axis=1)
+                # Re-seed empty clusters from random points so every list stays useful
+                sums[empty] = vectors[rng.choice(len(ids), int(empty.sum()))]
+                centroids = l2_normalize(sums)
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+        else:
+            centroids = np.zeros((0, vectors.shape[1]), np.float32)
+            assign = np.zeros(0, dtype=np.int64)
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_ids, self.list_vectors = [], []
+        for c in range(len(self.centroids)):
+            members = np.flatnonzero(assign == c)
+            self.list_ids.append([ids[i] for i in members])
+            self.list_vectors.append(np.ascontiguousarray(vectors[members]))
+        self._size = len(ids)
+
+    def __len__(self):
+        return self._size
+
+    def search(self, query, k=5, budget_ms=None):
+        """
+        Return [(id, score), ...] for the k most similar templates found in the
+        probed lists, best first. With `budget_ms`, probing stops early once the
+        budget is spent (the closest list is always searched).
+        """
+        if not self._size:
+            return []
+        start = time.perf_counter()
+        query = l2_normalize(query)
+        order = _top_k(self.centroids @ query, self.n_probe)
+
+        cand_ids, cand_scores = [], []
+        for n, c in enumerate(order):
+            if budget_ms is not None and n and (time.perf_counter() - start) * 1000 >= budget_ms:
+                break
+            if self.list_ids[c]:
+                cand_ids += self.list_ids[c]
+                cand_scores.append(self.list_vectors[c] @ query)
+        if not cand_scores:
+            return []
+        scores = np.concatenate(cand_scores)
+        return [(cand_ids[i], float(scores[i])) for i in _top_k(scores, k)]
+
+
+def build_index(ids, vectors, approximate=None, **ivf_kwargs):
+    """
+    Exact search for galleries up to EXACT_MAX_SIZE, IVF above that.
+    Pass approximate=True/False to force one or the other.
+    """
+    if approximate is None:
+        approximate = len(ids) > EXACT_MAX_SIZE
+    if approximate:
+        return IVFIndex(ids, vectors, **ivf_kwargs)
+    return ExactIndex(ids, vectors)